@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the genre lookup, genre enrichment and playlist
+extraction tools.
+
+Each benchmark runs in a fresh process against local HTTP stand-ins that
+replay the fixtures in bench_fixtures/ with configurable latency, error rate
+and rate limiting, and reports tracks/sec, API calls per track, p50/p99 API
+latency (as seen by the stand-in) and peak RSS.
+
+    python benchmark.py                        # run genre and extract
+    python benchmark.py enrich --mongo-uri mongodb://localhost:27017/best_benchmark
+    python benchmark.py --latency 0.05 --error-rate 0.02 --rate-limit 50
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json --tolerance 0.2
+
+With --baseline the run fails (exit code 1) when tracks/sec drops, or calls
+per track, p99 latency or peak RSS grow, by more than --tolerance.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, 'bench_fixtures')
+
+BENCHMARKS = ('genre', 'extract', 'enrich')
+
+# metric: True if higher is better
+METRICS = {
+    'tracks_per_sec': True,
+    'calls_per_track': False,
+    'p99_ms': False,
+    'peak_rss_mb': False,
+}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r') as f:
+        return json.load(f)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+# ---------------------------------------------------------
+# HTTP stand-ins
+# ---------------------------------------------------------
+class StandIn:
+    """
+    Local HTTP server answering API requests through `respond(path, query)`.
+
+    Adds `latency` seconds to every response, fails `error_rate` of them
+    with HTTP 503, and answers HTTP 429 (Retry-After: 1) once more than
+    `rate_limit` requests arrive within one second.
+    """
+
+    def __init__(self, respond, latency=0.0, error_rate=0.0, rate_limit=None, seed=0):
+        self.respond = respond
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self.latencies = []
+        self.calls = Counter()
+        self.window = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _admit(self):
+        """Return the status to fail this request with, or None."""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate_limit:
+                self.window = [t for t in self.window if now - t < 1]
+                if len(self.window) >= self.rate_limit:
+                    return 429
+                self.window.append(now)
+            if self.random.random() < self.error_rate:
+                return 503
+        return None
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                start = time.perf_counter()
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                status = stand_in._admit()
+                if status:
+                    body, headers = {'error': {'status': status}}, {'Retry-After': '1'} if status == 429 else {}
+                    stand_in.calls[str(status)] += 1
+                else:
+                    status, body = stand_in.respond(url.path, query)
+                    headers = {}
+                    stand_in.calls['ok'] += 1
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+                with stand_in._lock:
+                    stand_in.latencies.append(time.perf_counter() - start)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def lastfm_responder(fixture):
+    """Answer Last.fm API calls from the recorded responses in lastfm.json."""
+    def norm(value):
+        return " ".join(value.lower().split())
+
+    def respond(path, query):
+        method = query.get('method')
+        if method == 'artist.getTopTags':
+            key = norm(query.get('artist', ''))
+        else:
+            key = f"{norm(query.get('artist', ''))}|{norm(query.get('track', ''))}"
+        body = fixture.get(method, {}).get(key)
+        if body is not None:
+            return 200, body
+        if method == 'track.search':
+            return 200, {'results': {'trackmatches': {'track': []}}}
+        return 200, {'error': 6, 'message': 'Not found'}
+
+    return respond
+
+
+def spotify_responder(fixture, base_url_ref, playlist_size):
+    """Serve synthetic playlists of `playlist_size` tracks drawn from spotify.json."""
+    tracks = fixture['tracks']
+    owners = fixture['owners']
+
+    def page(playlist_id, offset, limit):
+        end = min(offset + limit, playlist_size)
+        items = [{'track': tracks[(offset + i) % len(tracks)]} for i in range(end - offset)]
+        next_url = None
+        if end < playlist_size:
+            next_url = f"{base_url_ref[0]}/v1/playlists/{playlist_id}/tracks?offset={end}&limit={limit}"
+        return {'items': items, 'total': playlist_size, 'limit': limit, 'offset': offset, 'next': next_url}
+
+    def respond(path, query):
+        parts = path.strip('/').split('/')
+        if len(parts) < 3 or parts[:2] != ['v1', 'playlists']:
+            return 404, {'error': {'status': 404, 'message': 'Not found'}}
+        playlist_id = parts[2]
+        if len(parts) == 4 and parts[3] == 'tracks':
+            return 200, page(playlist_id, int(query.get('offset', 0)), int(query.get('limit', 100)))
+        number = int(''.join(c for c in playlist_id if c.isdigit()) or 0)
+        return 200, {
+            'name': f"Benchmark Playlist {number}",
+            'snapshot_id': f"snapshot-{playlist_id}",
+            'owner': {'display_name': owners[number % len(owners)]},
+            'tracks': page(playlist_id, 0, 100),
+        }
+
+    return respond
+
+
+# ---------------------------------------------------------
+# Benchmarks (each runs in its own process)
+# ---------------------------------------------------------
+def bench_genre(options):
+    """Resolve the fixture tracks with get_genres()."""
+    fixture = load_fixture('lastfm.json')
+    with StandIn(lastfm_responder(fixture), **options['stand_in']) as stand_in:
+        os.environ['LASTFM_API_ROOT'] = stand_in.base_url + '/2.0/'
+        os.environ['LASTFM_API_KEY'] = 'benchmark'
+        import get_genre_search
+
+        pairs = [tuple(fixture['tracks'][i % len(fixture['tracks'])]) for i in range(options['tracks'])]
+        start = time.perf_counter()
+        results = dict(get_genre_search.get_genres(pairs, workers=options['workers'], rps=options['rps'],
+                                                   hedged=options.get('hedged', False)))
+        elapsed = time.perf_counter() - start
+        failed = sum(isinstance(genre, Exception) for genre in results.values())
+    return summarize(len(pairs), elapsed, stand_in, failed=failed)
+
+
+def bench_extract(options):
+    """Extract a synthetic folder of playlists through the CSV sink."""
+    import spotipy
+    import playlist_extractor
+
+    fixture = load_fixture('spotify.json')
+    base_url = [None]
+    respond = spotify_responder(fixture, base_url, options['playlist_size'])
+    with StandIn(respond, **options['stand_in']) as stand_in, tempfile.TemporaryDirectory() as tmpdir:
+        base_url[0] = stand_in.base_url
+        sp = spotipy.Spotify(
+            auth='benchmark',
+            status_retries=playlist_extractor.SPOTIFY_STATUS_RETRIES,
+            backoff_factor=playlist_extractor.SPOTIFY_BACKOFF_FACTOR,
+        )
+        sp.prefix = stand_in.base_url + '/v1/'
+        data = {
+            'name': 'Benchmark Folder',
+            'year': '2024',
+            'type': 'folder',
+            'children': [
+                {'type': 'playlist', 'author': 'Bench', 'uri': f"spotify:playlist:bench{i:04d}"}
+                for i in range(options['playlists'])
+            ],
+        }
+        sink = playlist_extractor.CsvSink(os.path.join(tmpdir, 'tracks.csv'))
+        start = time.perf_counter()
+        count = playlist_extractor.extract_folder(sp, data, sink, workers=options['workers'])
+        sink.close()
+        elapsed = time.perf_counter() - start
+    return summarize(count, elapsed, stand_in)
+
+
+def bench_enrich(options):
+    """Run update_missing_genres.py against a scratch database on a local mongod."""
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    fixture = load_fixture('lastfm.json')
+    client = MongoClient(options['mongo_uri'], serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command('ping')
+    except PyMongoError as e:
+        return {'skipped': f"no MongoDB at {options['mongo_uri']}: {e}"}
+
+    collection = client.get_database()['best']
+    collection.drop()
+    collection.insert_many([
+        {'artist': artist, 'track': track, 'year': '2024', 'playlist': 'Benchmark', 'genre': ''}
+        for artist, track in (fixture['tracks'][i % len(fixture['tracks'])] for i in range(options['tracks']))
+    ])
+
+    with StandIn(lastfm_responder(fixture), **options['stand_in']) as stand_in, \
+            tempfile.TemporaryDirectory() as tmpdir:
+        os.environ['LASTFM_API_ROOT'] = stand_in.base_url + '/2.0/'
+        os.environ['LASTFM_API_KEY'] = 'benchmark'
+        os.environ['MONGODB_URI'] = options['mongo_uri']
+        import update_missing_genres
+
+        argv = ['--no-cache', '--workers', str(options['workers']), '--rps', str(options['rps']),
+                '--journal', os.path.join(tmpdir, 'journal.json')]
+        if options.get('hedged'):
+            argv.append('--hedged')
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                update_missing_genres.main(argv)
+            finally:
+                sys.stdout = stdout
+        elapsed = time.perf_counter() - start
+    client.get_database().drop_collection('best')
+    client.close()
+    return summarize(options['tracks'], elapsed, stand_in)
+
+
+def summarize(tracks, elapsed, stand_in, failed=0):
+    latencies_ms = [latency * 1000 for latency in stand_in.latencies]
+    return {
+        'tracks': tracks,
+        'seconds': round(elapsed, 3),
+        'tracks_per_sec': round(tracks / elapsed, 1) if elapsed else 0.0,
+        'api_calls': stand_in.total_calls,
+        'calls_per_track': round(stand_in.total_calls / tracks, 2) if tracks else 0.0,
+        'rejected_calls': stand_in.total_calls - stand_in.calls['ok'],
+        'failed_tracks': failed,
+        'p50_ms': round(percentile(latencies_ms, 50), 2),
+        'p99_ms': round(percentile(latencies_ms, 99), 2),
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _run(name, options):
+    sys.path.insert(0, HERE)
+    return globals()[f"bench_{name}"](options)
+
+
+def run_benchmark(name, options):
+    """Run one benchmark in a fresh process so imports and peak RSS are isolated."""
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(_run, (name, options))
+
+
+# ---------------------------------------------------------
+# Baselines
+# ---------------------------------------------------------
+def find_regressions(results, baseline, tolerance):
+    """Return a message for every metric that regressed past `tolerance`."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous or 'skipped' in result or 'skipped' in previous:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = previous.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{name}.{metric}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the playlist-extractor tools against local API stand-ins.")
+    parser.add_argument('benchmarks', nargs='*', metavar='benchmark',
+                        help=f"Benchmarks to run, from {', '.join(BENCHMARKS)} "
+                             "(default: genre extract, plus enrich with --mongo-uri)")
+    parser.add_argument('--tracks', type=int, default=400, help="Tracks to resolve for genre/enrich (default: 400)")
+    parser.add_argument('--playlists', type=int, default=30, help="Playlists in the extract folder (default: 30)")
+    parser.add_argument('--playlist-size', type=int, default=250, help="Tracks per playlist (default: 250)")
+    parser.add_argument('--workers', type=int, default=4, help="Worker threads for each tool (default: 4)")
+    parser.add_argument('--rps', type=float, default=1000, help="Last.fm rate limit given to the tools (default: 1000)")
+    parser.add_argument('--hedged', action='store_true', help="Use hedged genre lookups in genre/enrich")
+    parser.add_argument('--latency', type=float, default=0.01, help="Seconds added to every API response (default: 0.01)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of API calls failing with 503")
+    parser.add_argument('--rate-limit', type=int, help="Requests/second before the stand-ins answer 429")
+    parser.add_argument('--mongo-uri', help="Scratch database for the enrich benchmark (it is dropped!)")
+    parser.add_argument('--baseline', help="JSON results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed regression (default: 0.2 = 20%%)")
+    parser.add_argument('--save-baseline', help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    names = args.benchmarks or ['genre', 'extract'] + (['enrich'] if args.mongo_uri else [])
+    options = {
+        'tracks': args.tracks,
+        'playlists': args.playlists,
+        'playlist_size': args.playlist_size,
+        'workers': args.workers,
+        'rps': args.rps,
+        'hedged': args.hedged,
+        'mongo_uri': args.mongo_uri or 'mongodb://localhost:27017/best_benchmark',
+        'stand_in': {'latency': args.latency, 'error_rate': args.error_rate, 'rate_limit': args.rate_limit},
+    }
+
+    results = {}
+    for name in names:
+        print(f"Running {name}...")
+        results[name] = run_benchmark(name, options)
+        print(json.dumps(results[name], indent=4))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Saved results to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the playlist-extractor tools.
+
+Each subcommand imports its tool (and the tool's Spotify, MongoDB or Last.fm
+dependencies and credentials) only when it runs, so `bestctl --help` and
+friends start instantly.
+
+Usage:
+    bestctl extract <json_file>... [options]   Extract playlists (playlist_extractor.py)
+    bestctl owners <json_file>...              Update playlist owners in folder JSON files
+    bestctl genre <artist> <track>             Look up one track's genre (get_genre_search.py)
+    bestctl enrich [options]                   Fill in missing genres (update_missing_genres.py)
+    bestctl summaries [year...]                Rebuild summary collections (materialize_summaries.py)
+    bestctl autocomplete [options]             Build the static autocomplete index (build_autocomplete_index.py)
+
+Run `bestctl <command> --help` for the options of each command.
+"""
+import importlib
+import sys
+
+# command: (module, extra arguments, description)
+COMMANDS = {
+    "extract": ("playlist_extractor", [], "Extract Spotify playlists to CSV/Parquet or MongoDB"),
+    "owners": ("playlist_extractor", ["--update-owners"], "Update playlist owners in folder JSON files"),
+    "genre": ("get_genre_search", [], "Look up the canonical genre of one track"),
+    "enrich": ("update_missing_genres", [], "Fill in missing genres in MongoDB"),
+    "summaries": ("materialize_summaries", [], "Rebuild the summary collections read by the web API"),
+    "autocomplete": ("build_autocomplete_index", [], "Build the static autocomplete index under public/"),
+}
+
+
+def usage():
+    lines = ["usage: bestctl <command> [args...]", "", "commands:"]
+    width = max(map(len, COMMANDS)) + 2
+    for name, (_, _, description) in COMMANDS.items():
+        lines.append(f"  {name:<{width}}{description}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+
+    command, args = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"bestctl: unknown command '{command}'\n\n{usage()}", file=sys.stderr)
+        return 2
+
+    module_name, extra, _ = COMMANDS[command]
+    module = importlib.import_module(module_name)
+    # Keep each tool's --help and error messages pointing at the subcommand
+    sys.argv[0] = f"bestctl {command}"
+    module.main(args + extra)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Build a static autocomplete index from the `best` collection.
+
+Mirrors the autocomplete mappings in indexDefinition.json: `track`, `artist`
+and `album` are split into words, lowercased and diacritic-folded, and every
+word is indexed by its edge grams of 2 to 15 characters. For each gram the
+index keeps the most frequent matching values of each field, so a browser can
+answer a keystroke with one static file fetch instead of an Atlas $search.
+
+Output (default ../../public/autocomplete/):
+    manifest.json   format description and the list of shards
+    <shard>.json    {gram: [[track values], [artist values], [album values]]}
+                    for every gram starting with the shard's two characters
+
+Usage:
+    python build_autocomplete_index.py [--out DIR] [--limit 20]
+"""
+import argparse
+import json
+import os
+import re
+import time
+import unicodedata
+
+FIELDS = ("track", "artist", "album")
+MIN_GRAMS = 2
+MAX_GRAMS = 15
+DEFAULT_LIMIT = 20
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUT_DIR = os.path.join(HERE, "..", "..", "public", "autocomplete")
+
+# Words the way lucene.standard splits them: runs of letters and digits,
+# keeping inner apostrophes ("don't")
+WORD = re.compile(r"[^\W_]+(?:['’][^\W_]+)*")
+
+
+def fold(text):
+    """Lowercase and strip diacritics ("Beyoncé" -> "beyonce")."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return WORD.findall(fold(text))
+
+
+def edge_grams(word):
+    """Edge grams of a word between MIN_GRAMS and MAX_GRAMS characters."""
+    return [word[:n] for n in range(MIN_GRAMS, min(len(word), MAX_GRAMS) + 1)]
+
+
+def shard_name(gram):
+    """File name (without .json) of the shard holding `gram`."""
+    prefix = gram[:MIN_GRAMS]
+    if re.fullmatch(r"[a-z0-9]+", prefix):
+        return prefix
+    return "x" + prefix.encode("utf-8").hex()
+
+
+def value_counts(collection, field):
+    """Yield (value, number of tracks) for every distinct value of a field."""
+    pipeline = [
+        {"$match": {field: {"$type": "string", "$ne": ""}}},
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+    ]
+    for row in collection.aggregate(pipeline, allowDiskUse=True):
+        yield row["_id"], row["count"]
+
+
+def build_index(values_by_field, limit=DEFAULT_LIMIT):
+    """
+    Build {gram: [[values] per field]} from {field: iterable of (value, count)}.
+
+    Each list holds at most `limit` values, most frequent first.
+    """
+    candidates = {}  # gram: [{value: count} per field]
+    for position, field in enumerate(FIELDS):
+        for value, count in values_by_field.get(field, ()):
+            value = value.strip()
+            grams = {gram for word in tokenize(value) for gram in edge_grams(word)}
+            for gram in grams:
+                entry = candidates.setdefault(gram, [{} for _ in FIELDS])
+                entry[position][value] = entry[position].get(value, 0) + count
+
+    index = {}
+    for gram, entry in candidates.items():
+        index[gram] = [
+            [value for value, _ in sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]]
+            for counts in entry
+        ]
+    return index
+
+
+def write_index(index, out_dir, limit=DEFAULT_LIMIT, documents=None):
+    """Write the index as one JSON file per shard plus manifest.json. Returns the shard names."""
+    shards = {}
+    for gram in sorted(index):
+        shards.setdefault(shard_name(gram), {})[gram] = index[gram]
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, grams in shards.items():
+        tmp_path = os.path.join(out_dir, name + ".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(grams, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, os.path.join(out_dir, name + ".json"))
+
+    manifest = {
+        "version": 1,
+        "fields": list(FIELDS),
+        "minGrams": MIN_GRAMS,
+        "maxGrams": MAX_GRAMS,
+        "limit": limit,
+        "foldDiacritics": True,
+        "documents": documents,
+        "built": int(time.time()),
+        "shards": sorted(shards),
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+
+    # Remove shards left over from a previous build
+    for file_name in os.listdir(out_dir):
+        name, ext = os.path.splitext(file_name)
+        if ext == ".json" and name != "manifest" and name not in shards:
+            os.remove(os.path.join(out_dir, file_name))
+    return sorted(shards)
+
+
+def lookup(out_dir, query, size=5):
+    """
+    Answer an autocomplete query from a written index, the way a client would.
+
+    The longest query word (capped at MAX_GRAMS) picks the gram; the other
+    words must prefix a word of each suggestion. Returns the grouped
+    suggestions in the shape of api/autocomplete.js.
+    """
+    words = tokenize(query)
+    if not words:
+        return []
+    key = max(words, key=len)[:MAX_GRAMS]
+    if len(key) < MIN_GRAMS:
+        return []
+    path = os.path.join(out_dir, shard_name(key) + ".json")
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        entry = json.load(f).get(key)
+    if not entry:
+        return []
+
+    groups = []
+    for field, values in zip(FIELDS, entry):
+        matches = [value for value in values
+                   if all(any(w.startswith(q) for w in tokenize(value)) for q in words)]
+        if matches:
+            groups.append({"type": field, "label": field.capitalize() + "s", "suggestions": matches[:size]})
+    return groups
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the static autocomplete index served from public/.")
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR, help="Output directory (default: public/autocomplete)")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT,
+                        help=f"Values kept per gram and field (default: {DEFAULT_LIMIT})")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    mongodb_uri = os.getenv("MONGODB_URI")
+    if not mongodb_uri:
+        raise SystemExit("ERROR: MONGODB_URI missing in .env")
+    client = MongoClient(mongodb_uri)
+    try:
+        collection = client.get_database()["best"]
+        documents = collection.estimated_document_count()
+        values = {field: list(value_counts(collection, field)) for field in FIELDS}
+    finally:
+        client.close()
+
+    index = build_index(values, limit=args.limit)
+    shards = write_index(index, args.out, limit=args.limit, documents=documents)
+    print(f"Indexed {sum(len(v) for v in values.values())} distinct values from {documents} tracks: "
+          f"{len(index)} grams in {len(shards)} shards under {os.path.normpath(args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Genre enrichment queue for the `best` collection.
+
+Tracks without a usable genre carry a `genreStatus` field ("missing",
+"unknown" or "error"); resolved tracks have none. A partial index covers
+only the tracks that have the field, so selecting the enrichment work set
+is an index scan proportional to the backlog rather than to the collection.
+"""
+
+STATUS_FIELD = "genreStatus"
+STATUSES = ("missing", "unknown", "error")
+# What update_missing_genres.py works on unless told otherwise
+DEFAULT_STATUSES = ("missing", "unknown")
+
+QUEUE_INDEX = "genre_queue"
+
+# genre value: status, for the values that do not count as a genre
+GENRE_STATUSES = {
+    None: "missing",
+    "": "missing",
+    " ": "missing",
+    "None": "missing",
+    "Unknown": "unknown",
+    "unknown": "unknown",
+    "error": "error",
+}
+
+
+def genre_status(genre):
+    """Return the queue status of a genre value, or None if it is resolved."""
+    if isinstance(genre, str) and not genre.strip():
+        return "missing"
+    return GENRE_STATUSES.get(genre)
+
+
+def status_update(genre):
+    """Update document setting `genre` and keeping genreStatus in step with it."""
+    status = genre_status(genre)
+    if status:
+        return {"$set": {"genre": genre, STATUS_FIELD: status}}
+    return {"$set": {"genre": genre}, "$unset": {STATUS_FIELD: ""}}
+
+
+def genre_query(statuses=STATUSES):
+    """Query for tracks whose genre value has one of `statuses`, whether or not they carry genreStatus."""
+    values = [genre for genre, status in GENRE_STATUSES.items() if status in statuses]
+    clauses = [{"genre": {"$in": values}}]
+    if "missing" in statuses:
+        clauses += [{"genre": {"$exists": False}}, {"genre": {"$regex": r"^\s*$"}}]
+    return {"$or": clauses} if len(clauses) > 1 else clauses[0]
+
+
+def queue_query(statuses=DEFAULT_STATUSES, year=None, after_id=None):
+    """Query for queued tracks in `statuses`, optionally limited to a year and to _ids after after_id."""
+    query = {STATUS_FIELD: {"$in": list(statuses)}}
+    if year is not None:
+        query["year"] = year
+    if after_id is not None:
+        query["_id"] = {"$gt": after_id}
+    return query
+
+
+def ensure_queue_index(collection):
+    """
+    Create the partial queue index, backfilling genreStatus the first time.
+    Returns the number of tracks that were queued by the backfill.
+    """
+    if QUEUE_INDEX in collection.index_information():
+        return 0
+    queued = backfill(collection)
+    collection.create_index(
+        [(STATUS_FIELD, 1), ("year", 1), ("_id", 1)],
+        name=QUEUE_INDEX,
+        partialFilterExpression={STATUS_FIELD: {"$exists": True}},
+    )
+    return queued
+
+
+def backfill(collection):
+    """Set genreStatus on every track from its genre (one full scan). Returns the tracks queued."""
+    collection.update_many({STATUS_FIELD: {"$exists": True}}, {"$unset": {STATUS_FIELD: ""}})
+    queued = 0
+    for status in STATUSES:
+        result = collection.update_many(genre_query([status]), {"$set": {STATUS_FIELD: status}})
+        queued += result.modified_count
+    return queued
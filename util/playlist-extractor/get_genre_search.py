@@ -1,18 +1,32 @@
 #!/usr/bin/env python3
 import os
+import re
+import time
+import random
 import argparse
-import requests
-from urllib.parse import quote_plus
-from dotenv import load_dotenv
+import threading
+import json
+from contextlib import contextmanager
+from functools import partial
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from lastfm_cache import LastfmCache, make_key
 
 # ---------------------------------------------------------
-# Load API key
+# API key (read from the environment / .env on first use)
 # ---------------------------------------------------------
-load_dotenv()
-API_KEY = os.getenv("LASTFM_API_KEY")
+API_KEY = None
 
-if not API_KEY:
-    raise SystemExit("ERROR: LASTFM_API_KEY missing in .env")
+
+def get_api_key():
+    global API_KEY
+    if not API_KEY:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        API_KEY = os.getenv("LASTFM_API_KEY")
+        if not API_KEY:
+            raise SystemExit("ERROR: LASTFM_API_KEY missing in .env")
+    return API_KEY
 
 
 # ---------------------------------------------------------
@@ -42,28 +56,548 @@ TAG_TO_CANONICAL = {
     for tag in tags
 }
 
+
+# ---------------------------------------------------------
+# Compiled tag matcher
+# ---------------------------------------------------------
+_GENRE = object()  # trie key marking the end of a phrase
+
+
+def tokenize(tag):
+    """Split a tag into normalized tokens ("Hip-Hop" -> ["hip", "hop"])."""
+    return re.findall(r"[a-z0-9&]+", tag.lower())
+
+
+class GenreMatcher:
+    """
+    Score canonical genres for a list of Last.fm tags.
+
+    The taxonomy phrases are compiled into a token trie, so compound tags
+    such as "indie rock" or "uk hip hop" match the phrases they contain
+    (longest phrase wins at each position). Every tag votes for the genres
+    it matches with its Last.fm `count` (or a rank-based weight when counts
+    are missing), split by how many of its tokens each phrase covers.
+    """
+
+    def __init__(self, taxonomy):
+        self.trie = {}
+        for genre, phrases in taxonomy.items():
+            for phrase in phrases:
+                node = self.trie
+                for token in tokenize(phrase):
+                    node = node.setdefault(token, {})
+                node.setdefault(_GENRE, genre)
+
+    def _phrases(self, tokens):
+        """Yield (genre, tokens covered) for each phrase found in a tag."""
+        i = 0
+        while i < len(tokens):
+            node, found = self.trie, None
+            for j in range(i, len(tokens)):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                if _GENRE in node:
+                    found = (node[_GENRE], j + 1)
+            if found:
+                genre, end = found
+                yield genre, end - i
+                i = end
+            else:
+                i += 1
+
+    def scores(self, tags):
+        """
+        Return {genre: score} for a tag list. Tags are names, in Last.fm's
+        order, or (name, count) pairs.
+        """
+        scores = {}
+        for rank, tag in enumerate(tags):
+            if isinstance(tag, str):
+                name, count = tag, None
+            else:
+                name, count = tag
+            weight = 100 / (rank + 1) if count is None else max(count, 1)
+            tokens = tokenize(name)
+            for genre, covered in self._phrases(tokens):
+                scores[genre] = scores.get(genre, 0) + weight * covered / len(tokens)
+        return scores
+
+    def match(self, tags):
+        """Return (best genre, confidence in 0..1), or (None, 0.0) if nothing matched."""
+        scores = self.scores(tags)
+        if not scores:
+            return None, 0.0
+        genre = max(scores, key=scores.get)
+        return genre, scores[genre] / sum(scores.values())
+
+    def match_many(self, tag_lists):
+        """Map a batch of tag lists in one call."""
+        return [self.match(tags) for tags in tag_lists]
+
+
+GENRE_MATCHER = GenreMatcher(CANONICAL_GENRES)
+
+# ---------------------------------------------------------
+# Rate limiting
+# ---------------------------------------------------------
+# Last.fm asks clients to stay under 5 requests/second per IP
+# (averaged over 5 minutes).
+LASTFM_RPS = 5
+DEFAULT_WORKERS = 4
+
+
+class RateLimiter:
+    """Thread-safe token bucket shared by every Last.fm request in the process."""
+
+    def __init__(self, rate, burst=None):
+        self._lock = threading.Lock()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        with self._lock:
+            self.rate = float(rate)
+            self.capacity = float(burst or max(1, rate))
+            self.tokens = self.capacity
+            self.updated = time.monotonic()
+
+    def acquire(self):
+        """Block until a request token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+LASTFM_LIMITER = RateLimiter(LASTFM_RPS)
+
+
 # ---------------------------------------------------------
 # Last.fm API helpers
 # ---------------------------------------------------------
-def lastfm_get_info(artist, track):
-    url = (
-        "https://ws.audioscrobbler.com/2.0/"
-        f"?method=track.getInfo&api_key={API_KEY}"
-        f"&artist={quote_plus(artist)}&track={quote_plus(track)}&format=json"
-    )
-    r = requests.get(url, timeout=10)
-    data = r.json()
+# Overridable so the benchmark can point the tools at a local stand-in
+API_ROOT = os.getenv("LASTFM_API_ROOT", "https://ws.audioscrobbler.com/2.0/")
+
+# Last.fm error codes that say nothing about the artist or track
+# (operation failed, service offline, temporarily unavailable, rate limited)
+TRANSIENT_ERRORS = {8, 11, 16, 29}
+# Last.fm error codes that reject the API key or account (invalid session
+# key, invalid API key, invalid signature, suspended API key): no retry and
+# no other track can succeed until the key is fixed
+FATAL_ERRORS = {9, 10, 13, 26}
+# The only error that is an answer about the artist or track
+NOT_FOUND_ERROR = 6
+
+
+class LastfmUnavailable(RuntimeError):
+    """Last.fm could not be reached or kept failing after retries."""
+
+
+class LastfmFatalError(RuntimeError):
+    """Last.fm rejected the API key or account; the run cannot continue."""
+
+
+# ---------------------------------------------------------
+# Instrumentation
+# ---------------------------------------------------------
+# Latency histogram bucket bounds in seconds (Prometheus client defaults)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class LookupStats:
+    """
+    Thread-safe counters for Last.fm lookups.
+
+    Records a latency histogram per API method (one observation per HTTP
+    attempt), error counts by kind, cache hits, and which tier of
+    get_genre() resolved each track together with the number of network
+    calls it took.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = {}    # method: [bucket counts..., +Inf count]
+            self.latency_sum = {}
+            self.errors = {}     # (method, kind): count
+            self.cache_hits = {}
+            self.tracks = {}     # tier: tracks resolved
+            self.tier_calls = {}  # tier: network calls spent on those tracks
+
+    def record_request(self, method, seconds, error=None):
+        """Record one HTTP attempt; `error` names the failure kind, if any."""
+        with self._lock:
+            buckets = self.latency.setdefault(method, [0] * (len(LATENCY_BUCKETS) + 1))
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[-1] += 1
+            self.latency_sum[method] = self.latency_sum.get(method, 0.0) + seconds
+            if error:
+                self.errors[method, error] = self.errors.get((method, error), 0) + 1
+
+    def record_error(self, method, kind):
+        """Record a failure that did not produce an HTTP response time."""
+        with self._lock:
+            self.errors[method, kind] = self.errors.get((method, kind), 0) + 1
+
+    def record_cache_hit(self, method):
+        with self._lock:
+            self.cache_hits[method] = self.cache_hits.get(method, 0) + 1
+
+    def record_resolution(self, tier, calls, tracks=1):
+        """Record `tracks` tracks resolved by `tier` using `calls` network calls."""
+        with self._lock:
+            self.tracks[tier] = self.tracks.get(tier, 0) + tracks
+            self.tier_calls[tier] = self.tier_calls.get(tier, 0) + calls
+
+    @staticmethod
+    def _quantile(buckets, q):
+        """Upper bound of the histogram bucket holding quantile q (None for +Inf)."""
+        target = q * sum(buckets)
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, buckets):
+            seen += count
+            if count and seen >= target:
+                return bound
+        return None
+
+    def as_dict(self):
+        with self._lock:
+            methods = set(self.latency) | set(self.cache_hits) | {m for m, _ in self.errors}
+            requests_by_method = {}
+            for method in sorted(methods):
+                buckets = self.latency.get(method, [0] * (len(LATENCY_BUCKETS) + 1))
+                count = sum(buckets)
+                entry = requests_by_method[method] = {
+                    "count": count,
+                    "cache_hits": self.cache_hits.get(method, 0),
+                    "errors": {kind: n for (m, kind), n in sorted(self.errors.items()) if m == method},
+                }
+                if count:
+                    p50, p99 = self._quantile(buckets, 0.5), self._quantile(buckets, 0.99)
+                    entry.update({
+                        "mean_ms": round(1000 * self.latency_sum[method] / count, 1),
+                        "p50_ms": p50 and p50 * 1000,
+                        "p99_ms": p99 and p99 * 1000,
+                        "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], buckets)),
+                    })
+
+            tiers = {
+                tier: {
+                    "tracks": tracks,
+                    "calls": self.tier_calls[tier],
+                    # Tiers that resolve no tracks themselves (artist_prefetch) have no rate
+                    "calls_per_track": round(self.tier_calls[tier] / tracks, 2) if tracks else None,
+                }
+                for tier, tracks in sorted(self.tracks.items())
+            }
+            total_tracks = sum(self.tracks.values())
+            total_calls = sum(sum(buckets) for buckets in self.latency.values())
+            return {
+                "tracks": total_tracks,
+                "requests": total_calls,
+                "requests_per_track": round(total_calls / total_tracks, 2) if total_tracks else 0.0,
+                "methods": requests_by_method,
+                "tiers": tiers,
+            }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_prometheus(self):
+        """Render the counters in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP lastfm_request_duration_seconds Last.fm HTTP request latency by API method.",
+                "# TYPE lastfm_request_duration_seconds histogram",
+            ]
+            for method, buckets in sorted(self.latency.items()):
+                cumulative = 0
+                for bound, count in zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], buckets):
+                    cumulative += count
+                    lines.append(f'lastfm_request_duration_seconds_bucket{{method="{method}",le="{bound}"}} {cumulative}')
+                lines.append(f'lastfm_request_duration_seconds_sum{{method="{method}"}} {self.latency_sum[method]:.6f}')
+                lines.append(f'lastfm_request_duration_seconds_count{{method="{method}"}} {cumulative}')
+
+            lines += [
+                "# HELP lastfm_request_errors_total Failed Last.fm requests by API method and kind.",
+                "# TYPE lastfm_request_errors_total counter",
+            ]
+            for (method, kind), count in sorted(self.errors.items()):
+                lines.append(f'lastfm_request_errors_total{{method="{method}",kind="{kind}"}} {count}')
+
+            lines += [
+                "# HELP lastfm_cache_hits_total Last.fm calls answered by the response cache.",
+                "# TYPE lastfm_cache_hits_total counter",
+            ]
+            for method, count in sorted(self.cache_hits.items()):
+                lines.append(f'lastfm_cache_hits_total{{method="{method}"}} {count}')
+
+            lines += [
+                "# HELP genre_resolutions_total Tracks resolved by each get_genre tier.",
+                "# TYPE genre_resolutions_total counter",
+            ]
+            for tier, count in sorted(self.tracks.items()):
+                lines.append(f'genre_resolutions_total{{tier="{tier}"}} {count}')
+
+            lines += [
+                "# HELP genre_resolution_calls_total Last.fm network calls spent per get_genre tier.",
+                "# TYPE genre_resolution_calls_total counter",
+            ]
+            for tier, count in sorted(self.tier_calls.items()):
+                lines.append(f'genre_resolution_calls_total{{tier="{tier}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+LOOKUP_STATS = LookupStats()
+
+# Network call counter of the innermost counting_calls() block on this thread
+_current_lookup = threading.local()
+# Counters may be shared with hedged lookups running on other threads
+_count_lock = threading.Lock()
+
+
+@contextmanager
+def counting_calls():
+    """
+    Count the Last.fm network calls (cache misses) made on this thread inside
+    the block. Yields a one-item list holding the count; nested blocks also
+    add their calls to the enclosing one.
+    """
+    previous = getattr(_current_lookup, "calls", None)
+    calls = _current_lookup.calls = [0]
+    try:
+        yield calls
+    finally:
+        _current_lookup.calls = previous
+        if previous is not None:
+            with _count_lock:
+                previous[0] += calls[0]
+
+
+def _count_call():
+    calls = getattr(_current_lookup, "calls", None)
+    if calls is not None:
+        with _count_lock:
+            calls[0] += 1
+
+
+class LastfmClient:
+    """
+    Keep-alive HTTP client for the Last.fm API.
+
+    Requests share one pooled Session, created on first use. Rate limits (HTTP 429 or error 29),
+    5xx responses, transient Last.fm errors and network failures are
+    retried with jittered exponential backoff, honouring Retry-After.
+    After `failure_threshold` consecutive calls fail outright the circuit
+    opens and calls fail fast for `reset_after` seconds.
+    """
+
+    def __init__(self, pool_size=DEFAULT_WORKERS * 2, max_retries=4, backoff=1.0,
+                 max_backoff=60.0, failure_threshold=5, reset_after=60.0,
+                 timeout=10, limiter=None, api_root=None, stats=None):
+        self.api_root = api_root or API_ROOT
+        self.stats = stats or LOOKUP_STATS
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.timeout = timeout
+        self.limiter = limiter or LASTFM_LIMITER
+        self.failures = 0
+        self.opened_at = None
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._session = None
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                self._session.mount("https://", adapter)
+                self._session.mount("http://", adapter)
+            return self._session
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+    def _check_circuit(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_after:
+                raise LastfmUnavailable("Last.fm circuit open after repeated failures")
+            # Half-open: let calls through; the next failure re-opens it
+            self.opened_at = None
+            self.failures = self.failure_threshold - 1
+
+    def _record(self, ok):
+        with self._lock:
+            if ok:
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def _delay(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    def get(self, params):
+        """GET the Last.fm API with the given query and return the decoded JSON body."""
+        import requests
+
+        method = params.get("method", "unknown")
+        try:
+            self._check_circuit()
+        except LastfmUnavailable:
+            self.stats.record_error(method, "circuit_open")
+            raise
+        problem = None
+        delay = 0
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(delay)
+            self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                r = self.session.get(self.api_root, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                kind = "timeout" if isinstance(e, requests.Timeout) else "connection"
+                self.stats.record_request(method, time.perf_counter() - start, kind)
+                problem = e
+                delay = self._delay(attempt)
+                continue
+            elapsed = time.perf_counter() - start
+
+            retry_after = r.headers.get("Retry-After")
+            if r.status_code == 429 or r.status_code >= 500:
+                kind = "rate_limited" if r.status_code == 429 else "server_error"
+                self.stats.record_request(method, elapsed, kind)
+                problem = f"HTTP {r.status_code}"
+                delay = self._delay(attempt, retry_after)
+                continue
+
+            try:
+                data = r.json()
+            except ValueError:
+                self.stats.record_request(method, elapsed, "invalid_json")
+                problem = f"HTTP {r.status_code}: invalid JSON"
+                delay = self._delay(attempt)
+                continue
+
+            if data.get("error") in TRANSIENT_ERRORS:
+                kind = "rate_limited" if data["error"] == 29 else "lastfm_error"
+                self.stats.record_request(method, elapsed, kind)
+                problem = f"Last.fm error {data['error']}: {data.get('message', '')}"
+                delay = self._delay(attempt, retry_after)
+                continue
+
+            if data.get("error") in FATAL_ERRORS:
+                self.stats.record_request(method, elapsed, "rejected")
+                raise LastfmFatalError(f"Last.fm error {data['error']}: {data.get('message', '')}")
+
+            self.stats.record_request(method, elapsed)
+            self._record(True)
+            return data
+
+        self.stats.record_error(method, "unavailable")
+        self._record(False)
+        raise LastfmUnavailable(f"Last.fm request failed after {self.max_retries + 1} attempts: {problem}")
+
+
+LASTFM_CLIENT = LastfmClient()
+
+
+def configure_client(**options):
+    """Replace the shared Last.fm client, e.g. to size its pool for more workers."""
+    global LASTFM_CLIENT
+    LASTFM_CLIENT.close()
+    LASTFM_CLIENT = LastfmClient(**options)
+    return LASTFM_CLIENT
+
+
+# Response cache, disabled until configure_cache() is called
+LASTFM_CACHE = None
+
+
+def configure_cache(path, **options):
+    """Enable the persistent response cache for every Last.fm helper."""
+    global LASTFM_CACHE
+    if LASTFM_CACHE is not None:
+        LASTFM_CACHE.close()
+    LASTFM_CACHE = LastfmCache(path, **options) if path else None
+    return LASTFM_CACHE
+
+
+def is_empty_response(data):
+    """True when a response carries no tags or matches ("nothing found")."""
+    if "error" in data:
+        return True
+    tags = data.get("toptags") or (data.get("track") or {}).get("toptags") or {}
+    if tags.get("tag"):
+        return False
+    matches = (data.get("results") or {}).get("trackmatches") or {}
+    return not matches.get("track")
+
+
+def lastfm_call(method, **params):
+    """Call a Last.fm API method and return the decoded JSON response."""
+    key = None
+    if LASTFM_CACHE is not None:
+        key = make_key(method, params)
+        hit, data = LASTFM_CACHE.get(key)
+        if hit:
+            LOOKUP_STATS.record_cache_hit(method)
+            return data
+
+    _count_call()
+    query = dict(params, method=method, api_key=get_api_key(), format="json")
+    data = LASTFM_CLIENT.get(query)
+
+    # Other errors (bad parameters, key problems) say nothing about the track
+    if key is not None and data.get("error", NOT_FOUND_ERROR) == NOT_FOUND_ERROR:
+        LASTFM_CACHE.set(key, data, negative=is_empty_response(data))
+    return data
+
+
+def lastfm_get_info(artist, track, autocorrect=False):
+    # With autocorrect Last.fm resolves misspelled artist and track names itself
+    params = {"autocorrect": 1} if autocorrect else {}
+    data = lastfm_call("track.getInfo", artist=artist, track=track, **params)
     return data.get("track")
 
 
 def lastfm_search(artist, track):
-    url = (
-        "https://ws.audioscrobbler.com/2.0/"
-        f"?method=track.search&api_key={API_KEY}"
-        f"&track={quote_plus(track)}&artist={quote_plus(artist)}&format=json"
-    )
-    r = requests.get(url, timeout=10)
-    data = r.json()
+    data = lastfm_call("track.search", track=track, artist=artist)
 
     try:
         matches = data["results"]["trackmatches"]["track"]
@@ -77,53 +611,75 @@ def lastfm_search(artist, track):
     return best.get("artist"), best.get("name")
 
 
-def lastfm_artist_tags(artist):
-    url = (
-        "https://ws.audioscrobbler.com/2.0/"
-        f"?method=artist.getTopTags&api_key={API_KEY}"
-        f"&artist={quote_plus(artist)}&format=json"
-    )
-    r = requests.get(url, timeout=10)
-    data = r.json()
+def parse_tags(toptags):
+    """Turn a Last.fm toptags object into [(name, count)]; count is None if absent."""
+    tags = (toptags or {}).get("tag", [])
+    if isinstance(tags, dict):
+        # Last.fm returns a bare object instead of a list for a single tag
+        tags = [tags]
+    parsed = []
+    for t in tags:
+        count = t.get("count")
+        parsed.append((t["name"].lower(), int(count) if count not in (None, "") else None))
+    return parsed
+
 
-    tags = data.get("toptags", {}).get("tag", [])
-    return [t["name"].lower() for t in tags]
+def lastfm_artist_tags(artist, autocorrect=False):
+    params = {"autocorrect": 1} if autocorrect else {}
+    data = lastfm_call("artist.getTopTags", artist=artist, **params)
+    return parse_tags(data.get("toptags"))
 
 
 def extract_track_tags(track_data):
     if not track_data:
         return []
-    tags = track_data.get("toptags", {}).get("tag", [])
-    return [t["name"].lower() for t in tags]
+    return parse_tags(track_data.get("toptags"))
 
 
 # ---------------------------------------------------------
 # Genre mapping
 # ---------------------------------------------------------
 def map_to_canonical(tags):
-    print (tags)
-    for tag in tags:
-        if tag in TAG_TO_CANONICAL:
-            return TAG_TO_CANONICAL[tag]
+    genre, _ = GENRE_MATCHER.match(tags)
+    return genre
 
 
 # ---------------------------------------------------------
 # Main logic: track → artist → fallback search
 # ---------------------------------------------------------
-def get_genre(artist, track):
+def get_genre(artist, track, artist_tags=None, hedged=False):
+    # artist_tags may be passed in when the caller already fetched them
+    # for this artist, saving the tier-2 request.
+    # hedged=True runs the track- and artist-level tiers concurrently; see
+    # _resolve_genre_hedged().
+    resolve = _resolve_genre_hedged if hedged else _resolve_genre
+    with counting_calls() as calls:
+        try:
+            genre, tier = resolve(artist, track, artist_tags)
+        except Exception:
+            LOOKUP_STATS.record_resolution("failed", calls[0])
+            raise
+    LOOKUP_STATS.record_resolution(tier, calls[0])
+    return genre
+
+
+def _resolve_genre(artist, track, artist_tags):
+    """Run the tiers of get_genre(); returns (genre, name of the tier that answered)."""
+
     # ---- 1. Track-level tags ----
     info = lastfm_get_info(artist, track)
     track_tags = extract_track_tags(info)
 
     genre = map_to_canonical(track_tags)
     if genre:
-        return genre
+        return genre, "track"
 
     # ---- 2. Artist-level tags (fallback) ----
-    artist_tags = lastfm_artist_tags(artist)
+    if artist_tags is None:
+        artist_tags = lastfm_artist_tags(artist)
     genre = map_to_canonical(artist_tags)
     if genre:
-        return genre
+        return genre, "artist"
 
     # ---- 3. Fallback search ----
     fallback = lastfm_search(artist, track)
@@ -135,26 +691,170 @@ def get_genre(artist, track):
 
         genre = map_to_canonical(track_tags)
         if genre:
-            return genre
+            return genre, "search_track"
 
         artist_tags = lastfm_artist_tags(corrected_artist)
         genre = map_to_canonical(artist_tags)
         if genre:
-            return genre
+            return genre, "search_artist"
+
+    return "Unknown", "unknown"
+
+
+# Threads running the concurrent tier lookups of hedged get_genre() calls
+HEDGE_POOL_SIZE = 32
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+
 
-    return "Unknown"
+def _get_hedge_pool():
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix="lastfm-hedge")
+        return _hedge_pool
+
+
+def _completed(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def _track_tags(artist, track, autocorrect=False):
+    return extract_track_tags(lastfm_get_info(artist, track, autocorrect=autocorrect))
+
+
+def _first_genre(candidates):
+    """
+    Given (tier, future of tags) pairs in priority order, return (genre, tier)
+    for the highest-priority tags that map to a genre, or (None, None).
+
+    Lower-priority lookups are not waited for once a higher one answers;
+    those that have not started yet are cancelled.
+    """
+    try:
+        for tier, future in candidates:
+            genre = map_to_canonical(future.result())
+            if genre:
+                return genre, tier
+        return None, None
+    finally:
+        for _, future in candidates:
+            future.cancel()
+
+
+def _resolve_genre_hedged(artist, track, artist_tags):
+    """
+    Low-latency variant of _resolve_genre().
+
+    Track tags (with Last.fm's autocorrect, which usually makes the search
+    tier unnecessary) and artist tags are requested at the same time, and
+    the highest-priority answer wins. The search fallback only runs when
+    both come back empty, and then looks up the corrected track and artist
+    concurrently as well. A track therefore costs at most three round
+    trips of latency instead of five.
+    """
+    pool = _get_hedge_pool()
+    calls = _current_lookup.calls
+
+    def submit(func, *args, **kwargs):
+        def run():
+            # Count the calls towards the get_genre() that asked for them
+            _current_lookup.calls = calls
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _current_lookup.calls = None
+        return pool.submit(run)
+
+    genre, tier = _first_genre([
+        ("track", submit(_track_tags, artist, track, autocorrect=True)),
+        ("artist", _completed(artist_tags) if artist_tags is not None
+         else submit(lastfm_artist_tags, artist, autocorrect=True)),
+    ])
+    if genre:
+        return genre, tier
+
+    fallback = lastfm_search(artist, track)
+    if fallback:
+        corrected_artist, corrected_track = fallback
+        genre, tier = _first_genre([
+            ("search_track", submit(_track_tags, corrected_artist, corrected_track)),
+            ("search_artist", submit(lastfm_artist_tags, corrected_artist)),
+        ])
+        if genre:
+            return genre, tier
+
+    return "Unknown", "unknown"
+
+
+# ---------------------------------------------------------
+# Batch lookups
+# ---------------------------------------------------------
+def run_concurrently(func, items, workers=DEFAULT_WORKERS):
+    """
+    Call func(*args) for each args tuple in `items` on a bounded worker pool.
+
+    Yields (index, result) tuples in completion order, where index is the
+    position of the args in `items`. A call that raised yields the
+    exception in place of the result. Only a couple of calls per worker are
+    queued at a time, so `items` may be a lazy iterable.
+    """
+    items = iter(enumerate(items))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+
+        def submit_next():
+            for index, args in items:
+                pending[pool.submit(func, *args)] = index
+                return True
+            return False
+
+        for _ in range(workers * 2):
+            if not submit_next():
+                break
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    yield index, future.result()
+                except Exception as e:
+                    yield index, e
+                submit_next()
+
+
+def get_genres(pairs, workers=DEFAULT_WORKERS, rps=None, hedged=False):
+    """
+    Resolve an iterable of (artist, track) pairs on a bounded worker pool.
+
+    Yields (index, genre) tuples as described in run_concurrently(). All
+    workers share LASTFM_LIMITER, so throughput grows with `workers` until
+    it reaches `rps`.
+    """
+    if rps:
+        LASTFM_LIMITER.set_rate(rps)
+    lookup = partial(get_genre, hedged=True) if hedged else get_genre
+    return run_concurrently(lookup, pairs, workers)
 
 
 # ---------------------------------------------------------
 # CLI
 # ---------------------------------------------------------
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Get canonical genre for a track using Last.fm with fallback search & artist fallback.")
     parser.add_argument("artist")
     parser.add_argument("track")
-    args = parser.parse_args()
+    parser.add_argument("--sequential", action="store_true",
+                        help="Try the lookup tiers one at a time instead of concurrently")
+    args = parser.parse_args(argv)
 
-    genre = get_genre(args.artist, args.track)
+    try:
+        genre = get_genre(args.artist, args.track, hedged=not args.sequential)
+    except LastfmFatalError as e:
+        raise SystemExit(f"ERROR: {e}")
     print(genre)
 
 
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Persistent single-file cache for Last.fm API responses.
+
+Responses are stored in SQLite keyed on the API method plus its normalized
+arguments, so re-runs of update_missing_genres.py only pay for lookups they
+have not made before.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+DAY = 24 * 60 * 60
+
+DEFAULT_CACHE_PATH = "lastfm.sqlite"
+DEFAULT_TTL = 30 * DAY
+DEFAULT_NEGATIVE_TTL = 7 * DAY
+DEFAULT_MAX_ENTRIES = 200_000
+
+# How many writes to allow between size checks
+EVICT_CHECK_INTERVAL = 500
+
+
+def normalize(value):
+    """Normalize an argument so trivially different spellings share a key."""
+    return " ".join(str(value).lower().split())
+
+
+def make_key(method, params):
+    """Build a cache key from a Last.fm method and its arguments."""
+    args = {name: normalize(value) for name, value in params.items()}
+    return method + ":" + json.dumps(args, sort_keys=True, ensure_ascii=False)
+
+
+class LastfmCache:
+    """SQLite-backed response cache with TTLs, negative entries and LRU eviction."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                negative INTEGER NOT NULL,
+                expires REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+
+    def get(self, key):
+        """Return (hit, value) for a key, treating expired entries as misses."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, negative, expires FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[2] < now:
+                self.misses += 1
+                return False, None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            if row[1]:
+                self.negative_hits += 1
+            return True, json.loads(row[0])
+
+    def set(self, key, value, negative=False):
+        """Store a response. Negative entries ("nothing found") use the shorter TTL."""
+        now = time.time()
+        ttl = self.negative_ttl if negative else self.ttl
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, negative, expires, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value), int(negative), now + ttl, now),
+            )
+            self._writes += 1
+            if self._writes % EVICT_CHECK_INTERVAL == 0:
+                self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now):
+        """Drop expired entries, then the least recently used ones over max_entries."""
+        self._db.execute("DELETE FROM responses WHERE expires < ?", (now,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                (excess,),
+            )
+
+    def evict(self):
+        with self._lock:
+            self._evict(time.time())
+            self._db.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
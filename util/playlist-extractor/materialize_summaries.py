@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Materialize summary collections from the `best` collection, so the web API
+can answer with single indexed reads instead of grouping every track:
+
+    summary_years      one document per year: track/playlist counts and its authors
+    summary_authors    one document per author: years, playlist and track counts
+    summary_playlists  one document per (year, playlist) with its tracks in order
+    summary_genres     one document per year: track counts per genre
+
+Summaries are rebuilt a year at a time, so after an ingest or an enrichment
+run only the years it touched need refreshing. playlist_extractor.py --ingest
+and update_missing_genres.py do this automatically.
+
+Usage:
+    python materialize_summaries.py              # rebuild every year
+    python materialize_summaries.py 2023 2024    # refresh just these years
+"""
+import argparse
+import datetime
+import os
+
+from genre_status import genre_status
+
+YEARS = "summary_years"
+AUTHORS = "summary_authors"
+PLAYLISTS = "summary_playlists"
+GENRES = "summary_genres"
+
+# Track fields copied into summary_playlists, in the shape the API returns
+PLAYLIST_TRACK_FIELDS = ('_id', 'track', 'artist', 'album', 'albumArtist', 'duration', 'time',
+                         'genre', 'trackNumber')
+
+
+def connect_to_mongodb():
+    """Connect to MongoDB and return the client and database."""
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    mongodb_uri = os.getenv("MONGODB_URI")
+    if not mongodb_uri:
+        raise SystemExit("ERROR: MONGODB_URI missing in .env")
+    client = MongoClient(mongodb_uri)
+    return client, client.get_database()
+
+
+def playlists_pipeline(year):
+    """Aggregation grouping one year's tracks into playlists with ordered track lists."""
+    return [
+        {"$match": {"year": year}},
+        {"$sort": {"playlist": 1, "trackNumber": 1}},
+        {"$group": {
+            "_id": "$playlist",
+            "playlistFolder": {"$first": "$playlistFolder"},
+            "author": {"$first": "$author"},
+            "tracks": {"$push": {field: f"${field}" for field in PLAYLIST_TRACK_FIELDS}},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+def summarize_year(year, playlists, now=None):
+    """
+    Build the summary documents of one year from its aggregated playlists.
+
+    Returns (playlist docs, year doc, genres doc).
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    playlist_docs = []
+    authors = {}
+    genres = {}
+    for group in playlists:
+        tracks = group["tracks"]
+        playlist_docs.append({
+            "year": year,
+            "playlist": group["_id"],
+            "playlistFolder": group.get("playlistFolder"),
+            "author": group.get("author"),
+            "trackCount": len(tracks),
+            "tracks": tracks,
+            "updatedAt": now,
+        })
+        author = group.get("author")
+        if author:
+            totals = authors.setdefault(author, {"author": author, "playlists": 0, "tracks": 0})
+            totals["playlists"] += 1
+            totals["tracks"] += len(tracks)
+        for track in tracks:
+            genre = track.get("genre")
+            # Anything still queued for enrichment counts as "Unknown"
+            genre = "Unknown" if genre_status(genre) else genre
+            genres[genre] = genres.get(genre, 0) + 1
+
+    year_doc = {
+        "_id": year,
+        "year": year,
+        "playlists": len(playlist_docs),
+        "tracks": sum(doc["trackCount"] for doc in playlist_docs),
+        "authors": [authors[name] for name in sorted(authors)],
+        "updatedAt": now,
+    }
+    genres_doc = {
+        "_id": year,
+        "year": year,
+        "genres": [{"genre": genre, "count": count}
+                   for genre, count in sorted(genres.items(), key=lambda item: (-item[1], item[0]))],
+        "updatedAt": now,
+    }
+    return playlist_docs, year_doc, genres_doc
+
+
+def summarize_authors(year_docs, now=None):
+    """Build summary_authors documents from summary_years documents."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    authors = {}
+    for year_doc in year_docs:
+        for entry in year_doc.get("authors", []):
+            name = entry["author"]
+            doc = authors.setdefault(name, {"_id": name, "author": name, "years": [],
+                                            "playlists": 0, "tracks": 0, "updatedAt": now})
+            doc["years"].append(year_doc["year"])
+            doc["playlists"] += entry["playlists"]
+            doc["tracks"] += entry["tracks"]
+    for doc in authors.values():
+        doc["years"].sort(reverse=True)
+    return [authors[name] for name in sorted(authors)]
+
+
+def ensure_indexes(db):
+    db[PLAYLISTS].create_index([("year", 1), ("playlist", 1)], unique=True, name="year_playlist")
+    db[PLAYLISTS].create_index([("author", 1), ("year", -1)], name="author_year")
+
+
+def refresh_year(db, year, source="best"):
+    """Rebuild the summaries of one year. Returns the number of tracks it holds."""
+    from pymongo import ReplaceOne
+
+    playlists = db[source].aggregate(playlists_pipeline(year), allowDiskUse=True)
+    playlist_docs, year_doc, genres_doc = summarize_year(year, playlists)
+
+    if playlist_docs:
+        db[PLAYLISTS].bulk_write([
+            ReplaceOne({"year": year, "playlist": doc["playlist"]}, doc, upsert=True)
+            for doc in playlist_docs
+        ], ordered=False)
+        db[YEARS].replace_one({"_id": year}, year_doc, upsert=True)
+        db[GENRES].replace_one({"_id": year}, genres_doc, upsert=True)
+    else:
+        db[YEARS].delete_one({"_id": year})
+        db[GENRES].delete_one({"_id": year})
+    # Drop playlists that were renamed or removed since the last refresh
+    db[PLAYLISTS].delete_many({"year": year, "playlist": {"$nin": [doc["playlist"] for doc in playlist_docs]}})
+    return year_doc["tracks"]
+
+
+def refresh_authors(db):
+    """Rebuild summary_authors from the (small) summary_years collection."""
+    from pymongo import ReplaceOne
+
+    author_docs = summarize_authors(db[YEARS].find({}, {"year": 1, "authors": 1}))
+    if author_docs:
+        db[AUTHORS].bulk_write([
+            ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in author_docs
+        ], ordered=False)
+    db[AUTHORS].delete_many({"_id": {"$nin": [doc["_id"] for doc in author_docs]}})
+
+
+def materialize(db, years=None, source="best"):
+    """
+    Refresh the summaries of `years` (every year when None) and the author
+    summary. Returns {year: track count}.
+    """
+    if years is None:
+        # Also refresh years that have disappeared from the source so they are removed
+        years = set(db[source].distinct("year")) | set(db[YEARS].distinct("_id"))
+    ensure_indexes(db)
+    counts = {}
+    for year in sorted(year for year in set(years) if year):
+        counts[year] = refresh_year(db, year, source)
+    refresh_authors(db)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build summary collections for the web API from the best collection.")
+    parser.add_argument("years", nargs="*", help="Years to refresh (default: all)")
+    args = parser.parse_args(argv)
+
+    client, db = connect_to_mongodb()
+    try:
+        counts = materialize(db, args.years or None)
+    finally:
+        client.close()
+    for year, tracks in counts.items():
+        print(f"{year}: {tracks} tracks")
+    print(f"Refreshed summaries for {len(counts)} years")
+
+
+if __name__ == "__main__":
+    main()
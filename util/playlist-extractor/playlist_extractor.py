@@ -2,13 +2,27 @@
 
 import os
 import sys
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-import pandas as pd
-from dotenv import load_dotenv
 import re
+import csv
+import glob
 import json
+import time
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from genre_status import genre_status, STATUS_FIELD
+
+# Upper bound on concurrent Spotify requests
+MAX_WORKERS = 8
+SPOTIFY_STATUS_RETRIES = 5
+SPOTIFY_BACKOFF_FACTOR = 0.5
+
+# Spotify `fields` filters: only what extract_track_data() and the owner
+# update read is transferred.
+TRACK_PAGE_FIELDS = 'items(track(id,name,duration_ms,album(name),artists(name))),next,total,limit,offset'
+PLAYLIST_FIELDS = f'name,snapshot_id,owner(display_name),tracks({TRACK_PAGE_FIELDS})'
+OWNER_FIELDS = 'name,snapshot_id,owner(display_name)'
+SNAPSHOT_FIELDS = 'snapshot_id'
 
 def extract_playlist_id(uri):
     """Extract playlist ID from Spotify URI."""
@@ -20,6 +34,10 @@ def extract_playlist_id(uri):
 
 def get_spotify_client():
     """Initialize and return an authenticated Spotify client."""
+    import spotipy
+    from spotipy.oauth2 import SpotifyOAuth
+    from dotenv import load_dotenv
+
     load_dotenv()
     
     client_id = os.getenv('SPOTIFY_CLIENT_ID')
@@ -28,30 +46,98 @@ def get_spotify_client():
     if not client_id or not client_secret:
         raise ValueError("Please set SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET in .env file")
     
-    sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
+    auth_manager = SpotifyOAuth(
         client_id=client_id,
         client_secret=client_secret,
         redirect_uri='http://localhost:8888/callback',
         scope='playlist-read-private playlist-read-collaborative'
-    ))
+    )
+    # Concurrent extraction can trip Spotify's rate limit; spotipy retries
+    # 429 responses after the Retry-After delay.
+    sp = spotipy.Spotify(
+        auth_manager=auth_manager,
+        status_retries=SPOTIFY_STATUS_RETRIES,
+        backoff_factor=SPOTIFY_BACKOFF_FACTOR,
+    )
     return sp
 
-def get_playlist_metadata(sp, playlist_id):
-    """Fetch playlist metadata from a playlist id."""
-    playlist = sp.playlist(playlist_id)
+def get_mongo_collection():
+    """Connect to MongoDB and return the client and the `best` collection."""
+    from pymongo import MongoClient
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    mongodb_uri = os.getenv('MONGODB_URI')
+    if not mongodb_uri:
+        raise ValueError("Please set MONGODB_URI in .env file")
+
+    client = MongoClient(mongodb_uri)
+    return client, client.get_database()['best']
+
+def get_playlist_metadata(sp, playlist_id, fields=None, cache=None):
+    """
+    Fetch playlist metadata from a playlist id.
+
+    `fields` limits the response to the given Spotify fields filter. If a
+    `cache` dict is passed, responses are kept in it so each playlist is
+    only requested once per run. The embedded tracks page is not cached.
+    """
+    key = (playlist_id, fields)
+    if cache is not None and key in cache:
+        return cache[key]
+    playlist = sp.playlist(playlist_id, fields=fields)
     if not playlist:
         raise ValueError("Playlist not found")
+    if cache is not None:
+        cache[key] = {k: v for k, v in playlist.items() if k != 'tracks'}
     return playlist
      
-def get_playlist_tracks(sp, playlist_id):
-    """Fetch all tracks from a playlist."""
-    results = sp.playlist_tracks(playlist_id)
-    tracks = results['items']
-    
+def iter_playlist_pages(sp, playlist_id, workers=1, first_page=None, fields=None):
+    """
+    Yield the pages of a playlist's tracks in order, as they arrive.
+
+    `first_page` may be the tracks page embedded in the playlist metadata,
+    which saves requesting it again. The remaining pages are requested by
+    offset, using the total from the first page. With workers > 1 up to
+    `workers` pages are in flight at once, so memory stays bounded by a
+    few pages whatever the playlist size.
+    """
+    if first_page is None:
+        first_page = sp.playlist_tracks(playlist_id, fields=fields)
+    results = first_page
+    yield results
+
+    if (workers > 1 or fields) and results['next'] and results.get('total'):
+        limit = results['limit']
+        offsets = range(results['offset'] + limit, results['total'], limit)
+
+        def fetch(offset):
+            return sp.playlist_tracks(playlist_id, fields=fields, offset=offset, limit=limit)
+
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                window = []
+                for offset in offsets:
+                    window.append(pool.submit(fetch, offset))
+                    if len(window) >= workers:
+                        yield window.pop(0).result()
+                for future in window:
+                    yield future.result()
+        else:
+            for offset in offsets:
+                yield fetch(offset)
+        return
+
     while results['next']:
         results = sp.next(results)
-        tracks.extend(results['items'])
-    
+        yield results
+
+def get_playlist_tracks(sp, playlist_id, workers=1, first_page=None, fields=None):
+    """Fetch all tracks from a playlist."""
+    tracks = []
+    for page in iter_playlist_pages(sp, playlist_id, workers=workers, first_page=first_page, fields=fields):
+        tracks.extend(page['items'])
     return tracks
 
 def ms_to_min_sec(ms):
@@ -61,41 +147,89 @@ def ms_to_min_sec(ms):
     remaining_seconds = seconds % 60
     return f"{minutes}:{remaining_seconds:02d}"
 
+class TrackRow:
+    """
+    One extracted track, in the shape of a `best` document.
+
+    Uses __slots__ to stay small; fields can be read as attributes or with
+    row['field'] like the dicts this replaces.
+    """
+
+    FIELDS = ('year', 'playlistFolder', 'playlist', 'track', 'album', 'artist', 'albumArtist',
+              'duration', 'time', 'genre', 'trackNumber', 'author')
+    __slots__ = FIELDS
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, values[field])
+
+    def __getitem__(self, field):
+        return getattr(self, field)
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __eq__(self, other):
+        return isinstance(other, TrackRow) and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return f"TrackRow({self.as_dict()!r})"
+
 def extract_track_data(track, author_name, playlist_name, playlist_folder_name, year, index):
     """Extract relevant metadata from a track."""
     track_data = track['track']
-    return {
-        'year': year,
-        'playlistFolder': playlist_folder_name,
-        'playlist': playlist_name,
-        'track': track_data['name'],
-        'album': track_data['album']['name'],
-        'artist': track_data['artists'][0]['name'],
-        'albumArtist': "",
-        'duration': track_data['duration_ms'],
-        'time': ms_to_min_sec(track_data['duration_ms']),
-        'genre': "",
-        'trackNumber': index,
-        'author': author_name
-    }
-
-def process_playlist(sp, playlist_uri, author_name, playlist_folder_name, year):
-    """Process a single playlist and return its track data."""
+    return TrackRow(
+        year=year,
+        playlistFolder=playlist_folder_name,
+        playlist=playlist_name,
+        track=track_data['name'],
+        album=track_data['album']['name'],
+        artist=track_data['artists'][0]['name'],
+        albumArtist="",
+        duration=track_data['duration_ms'],
+        time=ms_to_min_sec(track_data['duration_ms']),
+        genre="",
+        trackNumber=index,
+        author=author_name
+    )
+
+def iter_playlist_rows(sp, playlist_uri, author_name, playlist_folder_name, year, workers=1,
+                       lean=True, metadata_cache=None):
+    """
+    Yield a list of TrackRows for each page of a playlist, as pages arrive.
+
+    In lean mode only the fields used here are requested, and the first
+    page of tracks embedded in the playlist response is reused.
+    """
     playlist_id = extract_playlist_id(playlist_uri)
-    playlist = get_playlist_metadata(sp, playlist_id)
-    
-    print(f"Fetching tracks from playlist '{playlist['name']}' by {author_name}...")
-    tracks = get_playlist_tracks(sp, playlist_id)
-    
-    print(f"Processing {len(tracks)} tracks...")
+    fields = PLAYLIST_FIELDS if lean else None
+    playlist = get_playlist_metadata(sp, playlist_id, fields=fields, cache=metadata_cache)
+
+    pages = iter_playlist_pages(
+        sp,
+        playlist_id,
+        workers=workers,
+        first_page=playlist.get('tracks') if lean else None,
+        fields=TRACK_PAGE_FIELDS if lean else None,
+    )
+    index = 0
+    for page in pages:
+        rows = []
+        for track in page['items']:
+            rows.append(extract_track_data(track, author_name, playlist['name'], playlist_folder_name, year, index))
+            index += 1
+        yield rows
+
+def process_playlist(sp, playlist_uri, author_name, playlist_folder_name, year, workers=1,
+                     lean=True, metadata_cache=None):
+    """Process a single playlist and return its track data."""
     track_data = []
-    for index, track in enumerate(tracks):
-        print(f"Processing track {index + 1} of {len(tracks)}...")
-        track_data.append(extract_track_data(track, author_name, playlist['name'], playlist_folder_name, year, index))
-    
+    for rows in iter_playlist_rows(sp, playlist_uri, author_name, playlist_folder_name, year, workers=workers,
+                                   lean=lean, metadata_cache=metadata_cache):
+        track_data.extend(rows)
     return track_data
 
-def update_playlist_owners(sp, json_data):
+def update_playlist_owners(sp, json_data, metadata_cache=None):
     """Update playlist owners in the JSON data."""
     print("\nUpdating playlist owners...")
     for playlist in json_data['children']:
@@ -103,7 +237,7 @@ def update_playlist_owners(sp, json_data):
             continue
             
         playlist_id = extract_playlist_id(playlist['uri'])
-        playlist_metadata = get_playlist_metadata(sp, playlist_id)
+        playlist_metadata = get_playlist_metadata(sp, playlist_id, fields=OWNER_FIELDS, cache=metadata_cache)
         
         # Update the author field with the playlist owner's display name
         playlist['author'] = playlist_metadata['owner']['display_name']
@@ -111,7 +245,346 @@ def update_playlist_owners(sp, json_data):
     
     return json_data
 
-def main():
+class CsvSink:
+    """
+    Write extracted rows to a CSV file as they arrive.
+
+    A genreStatus column queues tracks without a genre for
+    update_missing_genres.py when the file is imported into `best`; it is
+    blank for resolved tracks (import with mongoimport --ignoreBlanks).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(TrackRow.FIELDS + (STATUS_FIELD,))
+
+    def write(self, rows):
+        for row in rows:
+            self.writer.writerow([row[field] for field in TrackRow.FIELDS] + [genre_status(row['genre']) or ''])
+        self.count += len(rows)
+
+    def end_playlist(self, row, count):
+        pass
+
+    def close(self):
+        self.file.close()
+        return f"Saved {self.count} tracks to {self.path}"
+
+# Rows per Parquet row group / Arrow record batch
+ROW_GROUP_SIZE = 65536
+
+class ArrowSink:
+    """
+    Write extracted rows to a Parquet or Arrow IPC file.
+
+    Rows arrive a Spotify page at a time and are buffered into row groups
+    (record batches for Arrow) of `row_group_size` rows. The repetitive
+    columns (year, folder, playlist, author, genre) are dictionary-encoded
+    and duration/trackNumber are stored as integers. genreStatus is set (as
+    in `best`) on tracks without a genre and null otherwise.
+    """
+
+    def __init__(self, path, file_format='parquet', row_group_size=ROW_GROUP_SIZE):
+        import pyarrow as pa
+
+        self.pa = pa
+        self.path = path
+        self.file_format = file_format
+        self.row_group_size = row_group_size
+        self.rows = []
+        self.count = 0
+        category = pa.dictionary(pa.int32(), pa.string())
+        self.schema = pa.schema([
+            ('year', category),
+            ('playlistFolder', category),
+            ('playlist', category),
+            ('track', pa.string()),
+            ('album', pa.string()),
+            ('artist', pa.string()),
+            ('albumArtist', category),
+            ('duration', pa.int64()),
+            ('time', pa.string()),
+            ('genre', category),
+            ('trackNumber', pa.int32()),
+            ('author', category),
+            (STATUS_FIELD, category),
+        ])
+        if file_format == 'parquet':
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+
+    def write(self, rows):
+        self.rows.extend(rows)
+        self.count += len(rows)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        columns = {
+            name: [str(row[name]) for row in rows] if name == 'year' else [row[name] for row in rows]
+            for name in TrackRow.FIELDS
+        }
+        columns[STATUS_FIELD] = [genre_status(row['genre']) for row in rows]
+        self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+
+    def end_playlist(self, row, count):
+        pass
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        return f"Saved {self.count} tracks to {self.path}"
+
+# Fields that identify a row of the `best` collection
+INGEST_KEY = ('year', 'playlistFolder', 'playlist', 'trackNumber')
+
+class MongoSink:
+    """
+    Upsert extracted rows straight into the `best` collection.
+
+    Rows are keyed on INGEST_KEY, so re-importing a folder updates rows in
+    place instead of duplicating them. Genres already filled in by
+    update_missing_genres.py are kept as long as the row still holds the
+    same track; new tracks, and rows whose track or artist changed (a
+    reordered or edited playlist), get the extracted genre and are queued
+    for enrichment with a genreStatus. Rows past the end of a re-imported
+    playlist are deleted. Writes are sent as unordered bulk upserts of
+    `batch_size` rows.
+    """
+
+    def __init__(self, collection, batch_size=500):
+        from pymongo import DeleteMany, UpdateOne
+
+        self.UpdateOne = UpdateOne
+        self.DeleteMany = DeleteMany
+        self.collection = collection
+        self.batch_size = batch_size
+        self.ops = []
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+        collection.create_index([(field, 1) for field in INGEST_KEY], name='ingest_key')
+
+    def write(self, rows):
+        for row in rows:
+            key = {field: row[field] for field in INGEST_KEY}
+            self.ops.append(self.UpdateOne(key, self.row_update(row), upsert=True))
+            if len(self.ops) >= self.batch_size:
+                self.flush()
+
+    def end_playlist(self, row, count):
+        """Delete the rows of `row`'s playlist from trackNumber `count` on, left over from a longer version."""
+        key = {field: row[field] for field in INGEST_KEY if field != 'trackNumber'}
+        self.ops.append(self.DeleteMany({**key, 'trackNumber': {'$gte': count}}))
+
+    @staticmethod
+    def row_update(row):
+        """
+        Update pipeline for a row. The genre and genreStatus are only set when
+        the stored track or artist differs from the row's, which includes
+        upserts; otherwise the stored ones are kept.
+        """
+        fields = {field: {'$literal': row[field]} for field in TrackRow.FIELDS
+                  if field not in INGEST_KEY and field != 'genre'}
+        replaced = {'$or': [{'$ne': ['$track', fields['track']]},
+                            {'$ne': ['$artist', fields['artist']]}]}
+        status = genre_status(row['genre'])
+        return [{'$set': {
+            **fields,
+            'genre': {'$cond': [replaced, {'$literal': row['genre']}, '$genre']},
+            STATUS_FIELD: {'$cond': [replaced, status or '$$REMOVE', f'${STATUS_FIELD}']},
+        }}]
+
+    def flush(self):
+        if not self.ops:
+            return
+        ops, self.ops = self.ops, []
+        result = self.collection.bulk_write(ops, ordered=False)
+        self.inserted += result.upserted_count
+        self.updated += result.modified_count
+        self.unchanged += result.matched_count - result.modified_count
+        self.deleted += result.deleted_count
+
+    def close(self):
+        self.flush()
+        return (f"Ingested into MongoDB: {self.inserted} inserted, "
+                f"{self.updated} updated, {self.unchanged} unchanged, {self.deleted} deleted")
+
+# Seconds between running-total progress lines
+PROGRESS_INTERVAL = 5
+
+class Progress:
+    """Report extraction progress per playlist and as a periodic running total."""
+
+    def __init__(self, label, total_playlists, interval=PROGRESS_INTERVAL):
+        self.label = label
+        self.total_playlists = total_playlists
+        self.interval = interval
+        self.playlists = 0
+        self.tracks = 0
+        self.last_report = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, count):
+        with self._lock:
+            self.tracks += count
+            now = time.monotonic()
+            if now - self.last_report >= self.interval:
+                self.last_report = now
+                print(f"{self.label}: {self.tracks} tracks so far")
+
+    def playlist_done(self, description, count):
+        with self._lock:
+            self.playlists += 1
+            print(f"{self.label}: [{self.playlists}/{self.total_playlists}] {description}: {count} tracks")
+
+def snapshot_state_path(json_file, target):
+    """
+    Path of the file that records playlist snapshot ids for a folder JSON.
+    Each output target (csv, parquet, arrow or ingest) has its own, so an
+    incremental run to one target does not hide changes from the others.
+    """
+    return f"{os.path.splitext(json_file)[0]}.{target}.snapshots.json"
+
+def load_snapshots(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_snapshots(path, snapshots):
+    with open(path, 'w') as f:
+        json.dump(snapshots, f, indent=4, sort_keys=True)
+
+def extract_folder(sp, data, sink, workers=1, lean=True, metadata_cache=None, snapshots=None):
+    """
+    Extract every playlist in a folder JSON into `sink`. Returns the number of rows written.
+
+    If a `snapshots` dict ({playlist id: snapshot id}) is passed, playlists
+    whose Spotify snapshot id is unchanged are skipped, and the dict is
+    updated with the snapshot ids of the playlists that were extracted.
+    """
+    playlists = [p for p in data['children'] if p['type'] == 'playlist']
+    # Parallelize across playlists, or across the pages of a lone playlist,
+    # but not both, so at most `workers` Spotify requests are in flight
+    page_workers = 1 if workers > 1 and len(playlists) > 1 else workers
+    new_snapshots = {}
+    progress = Progress(data['name'], len(playlists))
+    sink_lock = threading.Lock()
+
+    def extract(playlist):
+        if snapshots is not None:
+            playlist_id = extract_playlist_id(playlist['uri'])
+            snapshot_id = get_playlist_metadata(sp, playlist_id, fields=SNAPSHOT_FIELDS)['snapshot_id']
+            if snapshots.get(playlist_id) == snapshot_id:
+                progress.playlist_done(f"unchanged playlist by {playlist['author']}", 0)
+                return 0
+            new_snapshots[playlist_id] = snapshot_id
+
+        pages = iter_playlist_rows(
+            sp,
+            playlist['uri'],
+            playlist['author'],
+            data['name'],
+            data['year'],
+            workers=page_workers,
+            lean=lean,
+            metadata_cache=metadata_cache
+        )
+        count = 0
+        last_row = None
+        for rows in pages:
+            with sink_lock:
+                sink.write(rows)
+            if rows:
+                last_row = rows[-1]
+            count += len(rows)
+            progress.add(len(rows))
+        if last_row is not None:
+            with sink_lock:
+                sink.end_playlist(last_row, count)
+        progress.playlist_done(f"playlist by {playlist['author']}", count)
+        return count
+
+    if workers > 1:
+        # Each playlist's pages are written in order as they arrive; rows of
+        # playlists fetched at the same time may interleave in the output.
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            count = sum(pool.map(extract, playlists))
+    else:
+        count = sum(extract(playlist) for playlist in playlists)
+
+    if snapshots is not None:
+        snapshots.update(new_snapshots)
+    return count
+
+def load_folder(json_file):
+    """Read and validate a folder JSON file produced by spotifyfolders."""
+    with open(json_file, 'r') as f:
+        data = json.load(f)
+
+    if data['type'] != 'folder':
+        raise ValueError("JSON file must contain a folder structure")
+
+    if not data['name']:
+        raise ValueError("Folder name is required")
+
+    if not data['year']:
+        raise ValueError("Party Year is required")
+
+    return data
+
+def find_folder_files(paths):
+    """Expand directories and glob patterns into a list of folder JSON files."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = sorted(glob.glob(os.path.join(path, '*.json')))
+        else:
+            matches = sorted(glob.glob(path)) or [path]
+        for match in matches:
+            if not match.endswith('.snapshots.json') and match not in files:
+                files.append(match)
+    return files
+
+def extract_folder_file(sp, json_file, collection=None, workers=1, lean=True, incremental=False,
+                        metadata_cache=None, output_format='csv'):
+    """
+    Extract one folder JSON file into a CSV, Parquet or Arrow file named after
+    the folder, or into `collection` if given. Returns a summary line.
+    """
+    data = load_folder(json_file)
+    if collection is not None:
+        sink = MongoSink(collection)
+    elif output_format == 'csv':
+        sink = CsvSink(f"{data['name']}_tracks.csv")
+    else:
+        sink = ArrowSink(f"{data['name']}_tracks.{output_format}", file_format=output_format)
+
+    snapshots = None
+    if incremental:
+        state_file = snapshot_state_path(json_file, 'ingest' if collection is not None else output_format)
+        snapshots = load_snapshots(state_file)
+
+    count = extract_folder(sp, data, sink, workers=workers, lean=lean, metadata_cache=metadata_cache,
+                           snapshots=snapshots)
+    summary = sink.close()
+
+    # Only remember snapshots once their rows have been written
+    if snapshots is not None:
+        save_snapshots(state_file, snapshots)
+    return f"{json_file}: extracted {count} tracks from {len(data['children'])} playlists. {summary}"
+
+def main(argv=None):
     """
     Main function to extract Spotify playlist data and save it to a CSV file.
 
@@ -121,11 +594,22 @@ def main():
     3. Authenticates with the Spotify API using client credentials from the .env file.
     4. If the '--update-owners' flag is provided, updates the playlist owners in the JSON file.
     5. Processes each playlist in the folder structure to extract track metadata.
-    6. Saves the extracted track data to a CSV file named after the playlist folder.
+    6. Saves the extracted track data to a CSV file named after the playlist folder,
+       or with '--ingest', upserts it directly into the MongoDB `best` collection.
 
     Command-line arguments:
-    - json_file: Path to the JSON file containing playlist information.
+    - json_file: Path to the JSON file containing playlist information. Several files,
+      directories or glob patterns can be given to process many folders in one run.
     - --update-owners: Optional flag to update playlist owners in the JSON file.
+    - --workers: Number of playlists (and pages within a playlist) to fetch concurrently,
+      or of folders when several are given.
+    - --full: Request complete Spotify objects instead of only the fields that are used.
+    - --format: Output file format: csv (default), parquet or arrow (needs pyarrow).
+    - --ingest: Upsert tracks into MongoDB (MONGODB_URI) instead of writing a file.
+    - --incremental: Only extract playlists whose Spotify snapshot changed since the last
+      incremental run to the same output (tracked in <json_file>.<output>.snapshots.json).
+    - --no-summaries: With --ingest, skip refreshing the summary collections
+      (materialize_summaries.py) of the ingested years.
 
     Raises:
     - ValueError: If the JSON file is invalid or required fields are missing.
@@ -134,60 +618,86 @@ def main():
     Example usage:
     - Extract playlist data to CSV:
       python playlist_extractor.py playlists.json
+    - Load playlist data straight into MongoDB:
+      python playlist_extractor.py playlists.json --ingest
+    - Load every year's folder into MongoDB in one run:
+      python playlist_extractor.py 'folders/*.json' --ingest --workers 4
     - Update playlist owners in the JSON file:
       python playlist_extractor.py playlists.json --update-owners
     """
     parser = argparse.ArgumentParser(description='Extract Spotify playlist data to CSV')
-    parser.add_argument('json_file', help='JSON file containing playlist information')
+    parser.add_argument('json_files', nargs='+', metavar='json_file',
+                        help='JSON file containing playlist information, or a directory or glob of them')
     parser.add_argument('--update-owners', action='store_true', help='Update playlist owners in the JSON file')
-    args = parser.parse_args()
+    parser.add_argument('--workers', type=int, default=1,
+                        help=f'Fetch playlists and their pages concurrently (max {MAX_WORKERS})')
+    parser.add_argument('--full', action='store_true',
+                        help='Request complete playlist objects instead of only the fields used')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'arrow'], default='csv',
+                        help='Output file format (default: csv)')
+    parser.add_argument('--ingest', action='store_true',
+                        help='Upsert tracks into the MongoDB best collection instead of writing a file')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Skip playlists whose Spotify snapshot is unchanged since the last incremental run')
+    parser.add_argument('--no-summaries', action='store_true',
+                        help='With --ingest, do not refresh the summary collections of the ingested years')
+    args = parser.parse_args(argv)
+    workers = max(1, min(args.workers, MAX_WORKERS))
+    metadata_cache = {}
     
     try:
-        with open(args.json_file, 'r') as f:
-            data = json.load(f)
-        
-        if data['type'] != 'folder':
-            raise ValueError("JSON file must contain a folder structure")
-        
-        if not data['name']:
-            raise ValueError("Folder name is required")
-        playlist_folder_name = data['name']
-        
-        if not data['year']:
-            raise ValueError("Party Year is required")
-        party_year = data['year']
-        
+        json_files = find_folder_files(args.json_files)
+        if not json_files:
+            raise ValueError("No folder JSON files found")
+
+        # One authenticated client for every folder
         sp = get_spotify_client()
         
         # Update playlist owners if requested
         if args.update_owners:
-            data = update_playlist_owners(sp, data)
-            # Save the updated JSON back to the file
-            with open(args.json_file, 'w') as f:
-                json.dump(data, f, indent=4)
-            print(f"\nUpdated playlist owners saved to {args.json_file}")
+            for json_file in json_files:
+                data = update_playlist_owners(sp, load_folder(json_file), metadata_cache=metadata_cache)
+                # Save the updated JSON back to the file
+                with open(json_file, 'w') as f:
+                    json.dump(data, f, indent=4)
+                print(f"\nUpdated playlist owners saved to {json_file}")
             return
         
-        # Process playlists and create CSV
-        all_tracks = []
-        for playlist in data['children']:
-            if playlist['type'] != 'playlist':
-                continue
-                
-            track_data = process_playlist(
-                sp,
-                playlist['uri'],
-                playlist['author'],
-                playlist_folder_name,
-                party_year
-            )
-            all_tracks.extend(track_data)
-        
-        # Create DataFrame and save to CSV
-        df = pd.DataFrame(all_tracks)
-        output_file = f"{playlist_folder_name}_tracks.csv"
-        df.to_csv(output_file, index=False)
-        print(f"\nSuccessfully saved {len(all_tracks)} tracks from {len(data['children'])} playlists to {output_file}")
+        # Process playlists into CSV files or the database
+        client, collection = get_mongo_collection() if args.ingest else (None, None)
+
+        def extract(json_file, folder_workers):
+            return extract_folder_file(sp, json_file, collection=collection, workers=folder_workers,
+                                       lean=not args.full, incremental=args.incremental,
+                                       metadata_cache=metadata_cache, output_format=args.format)
+
+        failed = []
+        try:
+            if len(json_files) == 1:
+                print(f"\nSuccessfully {extract(json_files[0], workers)}")
+            else:
+                # Folders run concurrently, each fetching its playlists one at a
+                # time, so at most `workers` Spotify requests are in flight.
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    futures = {json_file: pool.submit(extract, json_file, 1) for json_file in json_files}
+                    for json_file, future in futures.items():
+                        try:
+                            print(f"\n{future.result()}")
+                        except Exception as e:
+                            print(f"\nError in {json_file}: {str(e)}")
+                            failed.append(json_file)
+            if collection is not None and not args.no_summaries:
+                from materialize_summaries import materialize
+
+                years = {load_folder(json_file)['year'] for json_file in json_files if json_file not in failed}
+                counts = materialize(collection.database, years)
+                print(f"Refreshed summaries for {len(counts)} year(s)")
+        finally:
+            if client:
+                client.close()
+
+        if failed:
+            raise ValueError(f"{len(failed)} of {len(json_files)} folders failed")
         
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Run journal for update_missing_genres.py.
+
+Records the last fully processed track _id (with the filters that chose
+the work set), so an interrupted enrichment run can be resumed without
+repeating Last.fm lookups, and the failed attempts of tracks that are
+still unresolved, so they are not looked up over and over. A --watch
+worker keeps its change stream resume token here as well.
+"""
+import json
+import os
+import time
+
+DEFAULT_JOURNAL_PATH = "enrich_journal.json"
+
+# Outcomes that count towards max_attempts. "deferred" (Last.fm was
+# unavailable) says nothing about the track, so it never causes a skip.
+FAILED_OUTCOMES = {"unknown", "error"}
+
+
+def _encode_id(track_id):
+    return str(track_id)
+
+
+def _decode_id(value):
+    from bson import ObjectId
+
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+
+class RunJournal:
+    """JSON file journal with a resume watermark and per-track failed attempts."""
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, max_attempts=3, retry_after=30 * 24 * 60 * 60):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_after = retry_after
+        self.watermark = None
+        self.filters = None
+        self.watch_token = None
+        self.tracks = {}
+        self.dirty = False
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                data = json.load(f)
+            self.watermark = data.get("watermark")
+            self.filters = data.get("filters")
+            self.watch_token = data.get("watch_token")
+            self.tracks = data.get("tracks", {})
+
+    def resume_after(self, filters=None):
+        """
+        The _id to continue after, or None if there is nothing to resume.
+        Raises ValueError if the watermark was recorded by a run with other
+        `filters`, whose work set it does not describe.
+        """
+        if self.watermark is None:
+            return None
+        if filters != self.filters:
+            raise ValueError(f"cannot resume: the interrupted run used {self.filters}, not {filters}")
+        return _decode_id(self.watermark)
+
+    def reset(self, filters=None):
+        """Start a new run on `filters`: forget the watermark but keep per-track history."""
+        self.watermark = None
+        self.filters = filters
+        self.dirty = True
+
+    def should_skip(self, track_id, now=None):
+        """True if the track already failed max_attempts times within retry_after."""
+        entry = self.tracks.get(_encode_id(track_id))
+        if not entry or entry["outcome"] not in FAILED_OUTCOMES:
+            return False
+        now = time.time() if now is None else now
+        return (entry["attempts"] >= self.max_attempts
+                and now - entry["last_attempt"] < self.retry_after)
+
+    def record(self, track_ids, outcome):
+        """
+        Record the outcome of a lookup. Only failed outcomes are kept; a
+        resolved (or inferred) track is forgotten, and a deferred one keeps
+        its history, so the journal only grows with the failing backlog.
+        """
+        if outcome not in FAILED_OUTCOMES:
+            if outcome != "deferred":
+                for track_id in track_ids:
+                    if self.tracks.pop(_encode_id(track_id), None):
+                        self.dirty = True
+            return
+        self.dirty = True
+        now = time.time()
+        for track_id in track_ids:
+            key = _encode_id(track_id)
+            entry = self.tracks.get(key, {"attempts": 0})
+            self.tracks[key] = {
+                "outcome": outcome,
+                "attempts": entry["attempts"] + 1,
+                "last_attempt": now,
+            }
+
+    def checkpoint(self, last_id):
+        """Advance the watermark once everything up to last_id has been written."""
+        self.watermark = _encode_id(last_id)
+        self.dirty = True
+        self.save()
+
+    def record_watch_token(self, token):
+        """Remember the change stream position a --watch worker has processed up to."""
+        self.watch_token = dict(token) if token is not None else None
+        self.dirty = True
+
+    def save(self):
+        """Write the journal if anything changed since it was loaded or last saved."""
+        if not self.dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"watermark": self.watermark, "filters": self.filters, "watch_token": self.watch_token,
+                       "tracks": self.tracks}, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
@@ -0,0 +1,109 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+from contextlib import redirect_stdout
+
+import benchmark
+
+
+def small_options(**overrides):
+    options = {
+        'tracks': 20,
+        'playlists': 2,
+        'playlist_size': 120,
+        'workers': 2,
+        'rps': 1000,
+        'mongo_uri': None,
+        'stand_in': {'latency': 0.0, 'error_rate': 0.0, 'rate_limit': None},
+    }
+    options.update(overrides)
+    return options
+
+
+class TestStandIn(unittest.TestCase):
+    def fetch(self, url):
+        try:
+            with urllib.request.urlopen(url) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    def test_lastfm_replays_fixtures_and_reports_misses(self):
+        respond = benchmark.lastfm_responder(benchmark.load_fixture('lastfm.json'))
+        with benchmark.StandIn(respond) as stand_in:
+            status, body = self.fetch(stand_in.base_url + '/2.0/?method=artist.getTopTags&artist=RADIOHEAD')
+            self.assertEqual(status, 200)
+            self.assertIn('toptags', body)
+
+            status, body = self.fetch(stand_in.base_url + '/2.0/?method=artist.getTopTags&artist=nobody')
+            self.assertEqual(body['error'], 6)
+        self.assertEqual(stand_in.total_calls, 2)
+        self.assertEqual(len(stand_in.latencies), 2)
+
+    def test_rate_limit_answers_429(self):
+        with benchmark.StandIn(lambda path, query: (200, {}), rate_limit=1) as stand_in:
+            self.assertEqual(self.fetch(stand_in.base_url + '/')[0], 200)
+            self.assertEqual(self.fetch(stand_in.base_url + '/')[0], 429)
+        self.assertEqual(stand_in.calls['429'], 1)
+
+    def test_spotify_pages_link_to_the_next_page(self):
+        base_url = ['http://stand-in']
+        respond = benchmark.spotify_responder(benchmark.load_fixture('spotify.json'), base_url, 150)
+        status, playlist = respond('/v1/playlists/bench0001', {})
+        self.assertEqual(status, 200)
+        self.assertEqual(len(playlist['tracks']['items']), 100)
+        self.assertEqual(playlist['tracks']['next'],
+                         'http://stand-in/v1/playlists/bench0001/tracks?offset=100&limit=100')
+        _, page = respond('/v1/playlists/bench0001/tracks', {'offset': '100', 'limit': '100'})
+        self.assertEqual(len(page['items']), 50)
+        self.assertIsNone(page['next'])
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_genre_benchmark(self):
+        result = benchmark.run_benchmark('genre', small_options())
+        self.assertEqual(result['tracks'], 20)
+        self.assertEqual(result['failed_tracks'], 0)
+        self.assertGreater(result['calls_per_track'], 0)
+        self.assertGreater(result['peak_rss_mb'], 0)
+
+    def test_extract_benchmark(self):
+        result = benchmark.run_benchmark('extract', small_options())
+        self.assertEqual(result['tracks'], 240)
+        # One metadata call with the first page plus one call for the second page
+        self.assertEqual(result['api_calls'], 4)
+
+
+class TestFindRegressions(unittest.TestCase):
+    BASELINE = {'genre': {'tracks_per_sec': 100, 'calls_per_track': 2.0, 'p99_ms': 20, 'peak_rss_mb': 40}}
+
+    def test_within_tolerance(self):
+        results = {'genre': {'tracks_per_sec': 90, 'calls_per_track': 2.2, 'p99_ms': 23, 'peak_rss_mb': 44}}
+        self.assertEqual(benchmark.find_regressions(results, self.BASELINE, 0.2), [])
+
+    def test_slower_and_chattier_runs_regress(self):
+        results = {'genre': {'tracks_per_sec': 70, 'calls_per_track': 3.0, 'p99_ms': 20, 'peak_rss_mb': 40}}
+        regressions = benchmark.find_regressions(results, self.BASELINE, 0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('genre.tracks_per_sec'))
+
+    def test_skipped_benchmarks_are_ignored(self):
+        results = {'genre': {'skipped': 'no MongoDB'}}
+        self.assertEqual(benchmark.find_regressions(results, self.BASELINE, 0.2), [])
+
+    def test_main_fails_on_regression(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'baseline.json')
+            with open(path, 'w') as f:
+                json.dump({'genre': {'tracks_per_sec': 10 ** 9}}, f)
+            with redirect_stdout(io.StringIO()):
+                status = benchmark.main(['genre', '--tracks', '5', '--latency', '0', '--baseline', path])
+        self.assertEqual(status, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+
+import bestctl
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ("spotipy", "pymongo", "requests", "pyarrow", "pandas", "dotenv")
+
+
+def run_python(*args, env=None):
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=HERE,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+
+def imported_modules(importtime_output):
+    """Top-level module names from `python -X importtime` output."""
+    modules = set()
+    for line in importtime_output.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip().split(".")[0])
+    return modules
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_help_does_not_import_heavy_dependencies(self):
+        result = run_python("-X", "importtime", "bestctl.py", "--help")
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("enrich", result.stdout)
+        loaded = imported_modules(result.stderr)
+        self.assertFalse(loaded & set(HEAVY_MODULES), loaded & set(HEAVY_MODULES))
+
+    def test_subcommand_help_does_not_import_heavy_dependencies(self):
+        for command in bestctl.COMMANDS:
+            with self.subTest(command=command):
+                result = run_python("-X", "importtime", "bestctl.py", command, "--help")
+                self.assertEqual(result.returncode, 0, result.stderr)
+                self.assertIn(f"bestctl {command}", result.stdout)
+                loaded = imported_modules(result.stderr)
+                heavy = loaded & set(HEAVY_MODULES + ("bson",))
+                self.assertFalse(heavy, heavy)
+
+    def test_tools_import_without_credentials(self):
+        env = {k: v for k, v in os.environ.items() if k not in ("LASTFM_API_KEY", "MONGODB_URI")}
+        result = run_python(
+            "-c", "import get_genre_search, update_missing_genres, playlist_extractor",
+            env=env,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+class TestDispatch(unittest.TestCase):
+
+    def test_owners_adds_update_owners_flag(self):
+        with patch("playlist_extractor.main") as mock_main, patch("sys.argv", ["bestctl.py"]):
+            self.assertEqual(bestctl.main(["owners", "2024.json"]), 0)
+        mock_main.assert_called_once_with(["2024.json", "--update-owners"])
+
+    def test_unknown_command(self):
+        with patch("sys.stderr"):
+            self.assertEqual(bestctl.main(["nope"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
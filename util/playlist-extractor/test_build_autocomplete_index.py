@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import unittest
+
+from build_autocomplete_index import (
+    build_index,
+    edge_grams,
+    fold,
+    lookup,
+    shard_name,
+    tokenize,
+    write_index,
+)
+
+VALUES = {
+    "track": [("Crazy in Love", 3), ("Creep", 5), ("Don't Stop Me Now", 1)],
+    "artist": [("Beyoncé", 4), ("Radiohead", 5), ("Queen", 1)],
+    "album": [("Dangerously in Love", 3), ("Pablo Honey", 5)],
+}
+
+
+class TestAutocompleteIndex(unittest.TestCase):
+
+    def test_folding_and_grams_match_index_definition(self):
+        self.assertEqual(fold("Beyoncé"), "beyonce")
+        self.assertEqual(tokenize("Don't Stop"), ["don't", "stop"])
+        self.assertEqual(edge_grams("radiohead"), ["ra", "rad", "radi", "radio", "radioh", "radiohe",
+                                                   "radiohea", "radiohead"])
+        self.assertEqual(len(edge_grams("supercalifragilistic")[-1]), 15)
+        self.assertEqual(edge_grams("a"), [])
+
+    def test_values_ranked_by_frequency(self):
+        index = build_index(VALUES)
+        self.assertEqual(index["cr"][0], ["Creep", "Crazy in Love"])
+        self.assertEqual(index["beyon"], [[], ["Beyoncé"], []])
+        self.assertEqual(index["lo"][2], ["Dangerously in Love"])
+
+    def test_limit(self):
+        index = build_index(VALUES, limit=1)
+        self.assertEqual(index["cr"][0], ["Creep"])
+
+    def test_shard_names(self):
+        self.assertEqual(shard_name("radio"), "ra")
+        self.assertEqual(shard_name("ön"), "x" + "ön".encode("utf-8").hex())
+
+    def test_written_index_answers_queries(self):
+        with tempfile.TemporaryDirectory() as out_dir:
+            open(os.path.join(out_dir, "zz.json"), "w").close()
+            shards = write_index(build_index(VALUES), out_dir, documents=18)
+            self.assertNotIn("zz.json", os.listdir(out_dir))
+            with open(os.path.join(out_dir, "manifest.json")) as f:
+                manifest = json.load(f)
+            self.assertEqual(manifest["shards"], shards)
+            self.assertEqual((manifest["minGrams"], manifest["maxGrams"]), (2, 15))
+
+            self.assertEqual(lookup(out_dir, "BEYONC"), [
+                {"type": "artist", "label": "Artists", "suggestions": ["Beyoncé"]},
+            ])
+            groups = lookup(out_dir, "in lov")
+            self.assertEqual([g["suggestions"] for g in groups], [["Crazy in Love"], ["Dangerously in Love"]])
+            self.assertEqual(lookup(out_dir, "q"), [])
+            self.assertEqual(lookup(out_dir, "zebra"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
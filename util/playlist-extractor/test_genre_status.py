@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import MagicMock
+
+from genre_status import (
+    genre_status,
+    genre_query,
+    status_update,
+    queue_query,
+    ensure_queue_index,
+    QUEUE_INDEX,
+)
+
+
+class TestGenreStatus(unittest.TestCase):
+
+    def test_genre_status(self):
+        for genre in (None, "", "   ", "None"):
+            self.assertEqual(genre_status(genre), "missing")
+        self.assertEqual(genre_status("Unknown"), "unknown")
+        self.assertEqual(genre_status("error"), "error")
+        self.assertIsNone(genre_status("Jazz"))
+
+    def test_status_update_clears_resolved_tracks(self):
+        self.assertEqual(status_update("Jazz"), {"$set": {"genre": "Jazz"}, "$unset": {"genreStatus": ""}})
+        self.assertEqual(status_update("error"), {"$set": {"genre": "error", "genreStatus": "error"}})
+
+    def test_queue_query(self):
+        self.assertEqual(queue_query(), {"genreStatus": {"$in": ["missing", "unknown"]}})
+        self.assertEqual(queue_query(["error"], year="2023", after_id=5),
+                         {"genreStatus": {"$in": ["error"]}, "year": "2023", "_id": {"$gt": 5}})
+
+    def test_genre_query_matches_genre_values(self):
+        self.assertEqual(genre_query(["unknown"]), {"genre": {"$in": ["Unknown", "unknown"]}})
+        clauses = genre_query(["missing", "error"])["$or"]
+        self.assertEqual(clauses[0], {"genre": {"$in": [None, "", " ", "None", "error"]}})
+        self.assertIn({"genre": {"$regex": r"^\s*$"}}, clauses)
+
+    def test_index_is_created_once_with_backfill(self):
+        collection = MagicMock()
+        collection.index_information.return_value = {"_id_": {}}
+        collection.update_many.return_value.modified_count = 2
+        self.assertEqual(ensure_queue_index(collection), 6)
+        kwargs = collection.create_index.call_args[1]
+        self.assertEqual(kwargs["name"], QUEUE_INDEX)
+        self.assertEqual(kwargs["partialFilterExpression"], {"genreStatus": {"$exists": True}})
+
+        collection.reset_mock()
+        collection.index_information.return_value = {QUEUE_INDEX: {}}
+        self.assertEqual(ensure_queue_index(collection), 0)
+        collection.update_many.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
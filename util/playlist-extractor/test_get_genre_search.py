@@ -0,0 +1,280 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+os.environ.setdefault("LASTFM_API_KEY", "test-key")
+
+import requests
+
+import get_genre_search
+from get_genre_search import (
+    RateLimiter,
+    LastfmClient,
+    LastfmUnavailable,
+    LookupStats,
+    GENRE_MATCHER,
+    get_genres,
+    map_to_canonical,
+    parse_tags,
+)
+
+
+class TestGenreMatcher(unittest.TestCase):
+
+    def test_exact_tags(self):
+        self.assertEqual(map_to_canonical(["seen live", "jazz"]), "Jazz")
+        self.assertIsNone(map_to_canonical(["seen live", "favorites"]))
+        self.assertIsNone(map_to_canonical([]))
+
+    def test_compound_tags(self):
+        self.assertEqual(map_to_canonical(["uk hip hop"]), "Hip-hop/Rap")
+        self.assertEqual(map_to_canonical(["Indie Rock"]), "Rock/Pop")
+        self.assertEqual(map_to_canonical(["Hip-Hop"]), "Hip-hop/Rap")
+        # The longest phrase wins over its parts
+        self.assertEqual(map_to_canonical(["latin jazz"]), "Jazz")
+
+    def test_counts_outweigh_order(self):
+        tags = [("rock", 10), ("electronic", 100), ("techno", 60)]
+        genre, confidence = GENRE_MATCHER.match(tags)
+        self.assertEqual(genre, "Electronic")
+        self.assertAlmostEqual(confidence, 160 / 170)
+
+    def test_match_many(self):
+        self.assertEqual(
+            GENRE_MATCHER.match_many([["reggae"], ["nothing"]]),
+            [("Reggae", 1.0), (None, 0.0)],
+        )
+
+    def test_parse_tags_handles_single_tag_object(self):
+        self.assertEqual(parse_tags({"tag": {"name": "Soul", "count": 5}}), [("soul", 5)])
+        self.assertEqual(parse_tags(None), [])
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_burst_then_throttle(self):
+        limiter = RateLimiter(20, burst=2)
+        start = time.monotonic()
+        for _ in range(4):
+            limiter.acquire()
+        # Two tokens are available immediately, the other two cost 1/20s each.
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            RateLimiter(0)
+
+
+class TestGetGenres(unittest.TestCase):
+
+    @patch("get_genre_search.get_genre")
+    def test_results_keyed_by_input_position(self, mock_get_genre):
+        mock_get_genre.side_effect = lambda artist, track: f"{artist}:{track}"
+        pairs = [("A", "1"), ("B", "2"), ("A", "1")]
+        results = dict(get_genres(pairs, workers=2))
+        self.assertEqual(results, {0: "A:1", 1: "B:2", 2: "A:1"})
+
+    @patch("get_genre_search.get_genre")
+    def test_errors_are_yielded(self, mock_get_genre):
+        mock_get_genre.side_effect = RuntimeError("boom")
+        results = list(get_genres([("A", "1")], workers=1))
+        self.assertEqual(results[0][0], 0)
+        self.assertIsInstance(results[0][1], RuntimeError)
+
+    @patch.object(get_genre_search.LASTFM_CLIENT.session, "get")
+    def test_lastfm_call_uses_shared_limiter(self, mock_get):
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {"toptags": {"tag": [{"name": "Rock"}]}}
+        with patch.object(get_genre_search.LASTFM_LIMITER, "acquire") as mock_acquire:
+            tags = get_genre_search.lastfm_artist_tags("Artist")
+        self.assertEqual(tags, [("rock", None)])
+        mock_acquire.assert_called_once()
+
+
+class TestLastfmCall(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        get_genre_search.configure_cache(os.path.join(self.tmpdir.name, "lastfm.sqlite"))
+
+    def tearDown(self):
+        get_genre_search.configure_cache(None)
+        self.tmpdir.cleanup()
+
+    @patch.object(get_genre_search.LASTFM_CLIENT.session, "get")
+    def test_repeat_lookups_are_served_from_cache(self, mock_get):
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {"toptags": {"tag": [{"name": "Jazz", "count": "100"}]}}
+        self.assertEqual(get_genre_search.lastfm_artist_tags("Miles Davis"), [("jazz", 100)])
+        self.assertEqual(get_genre_search.lastfm_artist_tags("miles davis "), [("jazz", 100)])
+        mock_get.assert_called_once()
+
+    def test_failed_lookups_are_not_cached(self):
+        with patch.object(get_genre_search, "LASTFM_CLIENT") as mock_client:
+            mock_client.get.side_effect = get_genre_search.LastfmUnavailable("down")
+            for _ in range(2):
+                with self.assertRaises(get_genre_search.LastfmUnavailable):
+                    get_genre_search.lastfm_artist_tags("Artist")
+        self.assertEqual(mock_client.get.call_count, 2)
+
+    @patch.object(get_genre_search.LASTFM_CLIENT.session, "get")
+    def test_only_not_found_errors_are_cached(self, mock_get):
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {"error": 6, "message": "Artist not found"}
+        for _ in range(2):
+            self.assertEqual(get_genre_search.lastfm_artist_tags("Nobody"), [])
+        mock_get.return_value.json.return_value = {"error": 7, "message": "Invalid resource specified"}
+        for _ in range(2):
+            self.assertEqual(get_genre_search.lastfm_artist_tags("Somebody"), [])
+        self.assertEqual(mock_get.call_count, 3)
+
+    @patch.object(get_genre_search.LASTFM_CLIENT.session, "get")
+    def test_rejected_api_key_is_fatal_and_not_cached(self, mock_get):
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {"error": 10, "message": "Invalid API key"}
+        for _ in range(2):
+            with self.assertRaises(get_genre_search.LastfmFatalError):
+                get_genre_search.get_genre("Artist", "Track")
+        self.assertEqual(mock_get.call_count, 2)
+
+
+def response(status, body=None, headers=None):
+    r = MagicMock()
+    r.status_code = status
+    r.headers = headers or {}
+    r.json.return_value = body or {}
+    return r
+
+
+@patch("get_genre_search.time.sleep")
+class TestLastfmClient(unittest.TestCase):
+
+    def setUp(self):
+        limiter = MagicMock()
+        self.client = LastfmClient(max_retries=2, failure_threshold=2, reset_after=60, limiter=limiter)
+        self.session_get = patch.object(self.client.session, "get").start()
+        self.addCleanup(patch.stopall)
+
+    def test_retries_rate_limit_and_honours_retry_after(self, mock_sleep):
+        self.session_get.side_effect = [
+            response(429, headers={"Retry-After": "7"}),
+            response(200, {"error": 29, "message": "Rate limit exceeded"}),
+            response(200, {"toptags": {"tag": []}}),
+        ]
+        self.assertEqual(self.client.get({}), {"toptags": {"tag": []}})
+        self.assertGreaterEqual(mock_sleep.call_args_list[0][0][0], 7)
+        self.assertEqual(self.session_get.call_count, 3)
+
+    def test_not_found_is_returned_without_retry(self, mock_sleep):
+        self.session_get.return_value = response(200, {"error": 6, "message": "Track not found"})
+        self.assertEqual(self.client.get({})["error"], 6)
+        mock_sleep.assert_not_called()
+
+    def test_circuit_opens_after_repeated_failures(self, mock_sleep):
+        self.session_get.side_effect = requests.ConnectionError("down")
+        for _ in range(2):
+            with self.assertRaises(LastfmUnavailable):
+                self.client.get({})
+        calls = self.session_get.call_count
+        with self.assertRaises(LastfmUnavailable):
+            self.client.get({})
+        self.assertEqual(self.session_get.call_count, calls)
+
+
+class TestLookupStats(unittest.TestCase):
+
+    def setUp(self):
+        self.stats = LookupStats()
+
+    def test_latency_histogram_and_errors(self):
+        self.stats.record_request("track.getInfo", 0.03)
+        self.stats.record_request("track.getInfo", 0.2, "rate_limited")
+        self.stats.record_request("track.getInfo", 30)
+        self.stats.record_error("track.getInfo", "unavailable")
+        method = self.stats.as_dict()["methods"]["track.getInfo"]
+        self.assertEqual(method["count"], 3)
+        self.assertEqual(method["buckets"]["0.05"], 1)
+        self.assertEqual(method["buckets"]["+Inf"], 1)
+        self.assertEqual(method["p50_ms"], 250)
+        self.assertIsNone(method["p99_ms"])
+        self.assertEqual(method["errors"], {"rate_limited": 1, "unavailable": 1})
+
+    def test_prometheus_histogram_is_cumulative(self):
+        self.stats.record_request("artist.getTopTags", 0.004)
+        self.stats.record_request("artist.getTopTags", 0.3)
+        self.stats.record_resolution("artist", calls=2)
+        text = self.stats.to_prometheus()
+        self.assertIn('lastfm_request_duration_seconds_bucket{method="artist.getTopTags",le="0.005"} 1', text)
+        self.assertIn('lastfm_request_duration_seconds_bucket{method="artist.getTopTags",le="0.5"} 2', text)
+        self.assertIn('lastfm_request_duration_seconds_count{method="artist.getTopTags"} 2', text)
+        self.assertIn('genre_resolutions_total{tier="artist"} 1', text)
+
+    @patch("get_genre_search.lastfm_search", return_value=None)
+    @patch("get_genre_search.lastfm_artist_tags", return_value=[])
+    @patch("get_genre_search.lastfm_get_info")
+    def test_get_genre_records_resolving_tier(self, mock_info, mock_tags, mock_search):
+        mock_info.return_value = {"toptags": {"tag": [{"name": "jazz"}]}}
+        with patch.object(get_genre_search, "LOOKUP_STATS", self.stats):
+            get_genre_search.get_genre("Miles Davis", "So What")
+            mock_info.return_value = None
+            get_genre_search.get_genre("Nobody", "Nothing")
+        tiers = self.stats.as_dict()["tiers"]
+        self.assertEqual(tiers["track"]["tracks"], 1)
+        self.assertEqual(tiers["unknown"]["tracks"], 1)
+
+    @patch.object(get_genre_search.LASTFM_CLIENT.session, "get")
+    def test_counting_calls_counts_network_calls(self, mock_get):
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {"toptags": {"tag": []}}
+        with get_genre_search.counting_calls() as outer:
+            get_genre_search.lastfm_artist_tags("A")
+            with get_genre_search.counting_calls() as inner:
+                get_genre_search.lastfm_artist_tags("B")
+        self.assertEqual(inner[0], 1)
+        self.assertEqual(outer[0], 2)
+
+
+class TestHedgedLookup(unittest.TestCase):
+
+    @patch("get_genre_search.lastfm_search")
+    @patch("get_genre_search.lastfm_artist_tags")
+    @patch("get_genre_search.lastfm_get_info")
+    def test_track_tags_win_without_waiting_for_artist(self, mock_info, mock_tags, mock_search):
+        release = threading.Event()
+        mock_info.return_value = {"toptags": {"tag": [{"name": "jazz"}]}}
+        mock_tags.side_effect = lambda *args, **kwargs: release.wait(5) and [("rock", 100)]
+        try:
+            self.assertEqual(get_genre_search.get_genre("Miles Davis", "So What", hedged=True), "Jazz")
+        finally:
+            release.set()
+        mock_info.assert_called_once_with("Miles Davis", "So What", autocorrect=True)
+        mock_search.assert_not_called()
+
+    @patch("get_genre_search.lastfm_search", return_value=None)
+    @patch("get_genre_search.lastfm_artist_tags", return_value=[("bebop", 10)])
+    @patch("get_genre_search.lastfm_get_info", return_value=None)
+    def test_artist_tags_answer_when_track_has_none(self, mock_info, mock_tags, mock_search):
+        self.assertEqual(get_genre_search.get_genre("Miles Davis", "So What", hedged=True), "Jazz")
+        mock_tags.assert_called_once_with("Miles Davis", autocorrect=True)
+        mock_search.assert_not_called()
+
+    @patch("get_genre_search.lastfm_search", return_value=("Radiohead", "Creep"))
+    @patch("get_genre_search.lastfm_artist_tags")
+    @patch("get_genre_search.lastfm_get_info", return_value=None)
+    def test_search_fallback_looks_up_corrected_names(self, mock_info, mock_tags, mock_search):
+        mock_tags.side_effect = lambda artist, **kwargs: [("rock", 100)] if artist == "Radiohead" else []
+        self.assertEqual(get_genre_search.get_genre("Radiohed", "Creep", hedged=True), "Rock/Pop")
+        mock_info.assert_any_call("Radiohead", "Creep", autocorrect=False)
+
+    @patch("get_genre_search.lastfm_artist_tags", return_value=[])
+    @patch("get_genre_search.lastfm_get_info", side_effect=LastfmUnavailable("down"))
+    def test_unavailable_track_lookup_is_raised(self, mock_info, mock_tags):
+        with self.assertRaises(LastfmUnavailable):
+            get_genre_search.get_genre("Artist", "Track", hedged=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from lastfm_cache import LastfmCache, make_key
+
+
+class TestLastfmCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "lastfm.sqlite")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_make_key_normalizes_arguments(self):
+        self.assertEqual(
+            make_key("artist.getTopTags", {"artist": "  The  Beatles "}),
+            make_key("artist.getTopTags", {"artist": "the beatles"}),
+        )
+        self.assertNotEqual(
+            make_key("artist.getTopTags", {"artist": "x"}),
+            make_key("artist.getInfo", {"artist": "x"}),
+        )
+
+    def test_hit_miss_and_persistence(self):
+        cache = LastfmCache(self.path)
+        self.assertEqual(cache.get("k"), (False, None))
+        cache.set("k", {"toptags": {"tag": []}})
+        self.assertEqual(cache.get("k"), (True, {"toptags": {"tag": []}}))
+        cache.close()
+
+        cache = LastfmCache(self.path)
+        self.assertTrue(cache.get("k")[0])
+        self.assertEqual(cache.stats()["hits"], 1)
+        cache.close()
+
+    def test_negative_entries_use_negative_ttl(self):
+        cache = LastfmCache(self.path, ttl=100, negative_ttl=10)
+        with patch("lastfm_cache.time.time", return_value=1000):
+            cache.set("found", {"a": 1})
+            cache.set("missing", {"error": 6}, negative=True)
+        with patch("lastfm_cache.time.time", return_value=1050):
+            self.assertTrue(cache.get("found")[0])
+            self.assertFalse(cache.get("missing")[0])
+        cache.close()
+
+    def test_evicts_least_recently_used(self):
+        cache = LastfmCache(self.path, max_entries=2)
+        now = time.time()
+        for i, key in enumerate(["a", "b", "c"]):
+            with patch("lastfm_cache.time.time", return_value=now - 10 + i):
+                cache.set(key, i)
+        cache.evict()
+        self.assertFalse(cache.get("a")[0])
+        self.assertTrue(cache.get("c")[0])
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import datetime
+import unittest
+from collections import defaultdict
+from unittest.mock import MagicMock
+
+from materialize_summaries import (
+    summarize_year,
+    summarize_authors,
+    refresh_year,
+    PLAYLISTS,
+    YEARS,
+)
+
+NOW = datetime.datetime(2024, 1, 1)
+
+
+def playlist(name, author, genres):
+    return {
+        "_id": name,
+        "playlistFolder": "Best of 2023",
+        "author": author,
+        "tracks": [{"track": f"{name} {i}", "genre": genre, "trackNumber": i} for i, genre in enumerate(genres)],
+    }
+
+
+class TestSummaries(unittest.TestCase):
+
+    def test_summarize_year(self):
+        playlists = [
+            playlist("A", "Ann", ["Jazz", "Jazz", ""]),
+            playlist("B", "Bob", ["Rock/Pop"]),
+            playlist("C", "Ann", ["Jazz", "error"]),
+        ]
+        playlist_docs, year_doc, genres_doc = summarize_year("2023", playlists, now=NOW)
+        self.assertEqual([doc["playlist"] for doc in playlist_docs], ["A", "B", "C"])
+        self.assertEqual(playlist_docs[0]["trackCount"], 3)
+        self.assertEqual(year_doc["tracks"], 6)
+        self.assertEqual(year_doc["playlists"], 3)
+        self.assertEqual(year_doc["authors"], [
+            {"author": "Ann", "playlists": 2, "tracks": 5},
+            {"author": "Bob", "playlists": 1, "tracks": 1},
+        ])
+        self.assertEqual(genres_doc["genres"], [
+            {"genre": "Jazz", "count": 3},
+            {"genre": "Unknown", "count": 2},
+            {"genre": "Rock/Pop", "count": 1},
+        ])
+
+    def test_unresolved_genres_count_as_unknown(self):
+        _, _, genres_doc = summarize_year("2023", [playlist("A", "Ann", ["  ", "Unknown", None, "None"])], now=NOW)
+        self.assertEqual(genres_doc["genres"], [{"genre": "Unknown", "count": 4}])
+
+    def test_summarize_authors_across_years(self):
+        year_docs = [
+            {"year": "2022", "authors": [{"author": "Ann", "playlists": 1, "tracks": 10}]},
+            {"year": "2023", "authors": [{"author": "Ann", "playlists": 2, "tracks": 25},
+                                         {"author": "Bob", "playlists": 1, "tracks": 7}]},
+        ]
+        authors = summarize_authors(year_docs, now=NOW)
+        self.assertEqual([doc["_id"] for doc in authors], ["Ann", "Bob"])
+        self.assertEqual(authors[0]["years"], ["2023", "2022"])
+        self.assertEqual((authors[0]["playlists"], authors[0]["tracks"]), (3, 35))
+
+    def test_refresh_year_replaces_playlists_and_drops_stale_ones(self):
+        db = defaultdict(MagicMock)
+        db["best"].aggregate.return_value = [playlist("A", "Ann", ["Jazz"])]
+        self.assertEqual(refresh_year(db, "2023"), 1)
+        ops = db[PLAYLISTS].bulk_write.call_args[0][0]
+        self.assertEqual(len(ops), 1)
+        db[PLAYLISTS].delete_many.assert_called_once_with({"year": "2023", "playlist": {"$nin": ["A"]}})
+        db[YEARS].replace_one.assert_called_once()
+
+    def test_refresh_empty_year_removes_its_summaries(self):
+        db = defaultdict(MagicMock)
+        db["best"].aggregate.return_value = []
+        self.assertEqual(refresh_year(db, "1999"), 0)
+        db[YEARS].delete_one.assert_called_once_with({"_id": "1999"})
+        db[PLAYLISTS].bulk_write.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
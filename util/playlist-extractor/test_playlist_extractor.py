@@ -1,5 +1,9 @@
+import json
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
+from pymongo import DeleteMany
 from playlist_extractor import (
     extract_playlist_id,
     get_spotify_client,
@@ -8,8 +12,48 @@ from playlist_extractor import (
     ms_to_min_sec,
     extract_track_data,
     process_playlist,
+    MongoSink,
+    CsvSink,
+    TrackRow,
+    iter_playlist_pages,
+    ArrowSink,
+    extract_folder,
+    extract_folder_file,
+    find_folder_files,
+    PLAYLIST_FIELDS,
+    TRACK_PAGE_FIELDS,
 )
 
+def apply_pipeline(doc, pipeline):
+    """Apply a single-$set update pipeline the way MongoDB would (only the operators MongoSink uses)."""
+    def evaluate(expr):
+        if isinstance(expr, str) and expr.startswith("$$"):
+            return REMOVE
+        if isinstance(expr, str) and expr.startswith("$"):
+            return doc.get(expr[1:], REMOVE)
+        if isinstance(expr, dict):
+            (op, arg), = expr.items()
+            if op == "$literal":
+                return arg
+            if op == "$ne":
+                return evaluate(arg[0]) != evaluate(arg[1])
+            if op == "$or":
+                return any(evaluate(e) for e in arg)
+            if op == "$cond":
+                return evaluate(arg[1]) if evaluate(arg[0]) else evaluate(arg[2])
+        return expr
+
+    REMOVE = object()
+    (stage,) = pipeline
+    values = {field: evaluate(expr) for field, expr in stage["$set"].items()}
+    for field, value in values.items():
+        if value is REMOVE:
+            doc.pop(field, None)
+        else:
+            doc[field] = value
+    return doc
+
+
 class TestPlaylistExtractor(unittest.TestCase):
 
     def test_extract_playlist_id_valid(self):
@@ -21,22 +65,22 @@ class TestPlaylistExtractor(unittest.TestCase):
         with self.assertRaises(ValueError):
             extract_playlist_id(uri)
 
-    @patch("playlist_extractor.spotipy.Spotify")
+    @patch("spotipy.Spotify")
     def test_get_spotify_client(self, mock_spotify):
-        with patch("playlist_extractor.SpotifyOAuth") as mock_auth:
+        with patch("spotipy.oauth2.SpotifyOAuth") as mock_auth:
             mock_auth.return_value = MagicMock()
             client = get_spotify_client()
             self.assertIsNotNone(client)
             mock_spotify.assert_called_once()
 
-    @patch("playlist_extractor.spotipy.Spotify")
+    @patch("spotipy.Spotify")
     def test_get_playlist_metadata(self, mock_spotify):
         mock_spotify.return_value.playlist.return_value = {"name": "Test Playlist"}
         sp = mock_spotify()
         playlist_metadata = get_playlist_metadata(sp, "12345abcde")
         self.assertEqual(playlist_metadata["name"], "Test Playlist")
 
-    @patch("playlist_extractor.spotipy.Spotify")
+    @patch("spotipy.Spotify")
     def test_get_playlist_tracks(self, mock_spotify):
         mock_spotify.return_value.playlist_tracks.return_value = {
             "items": [{"track": {"name": "Track 1"}}],
@@ -47,6 +91,18 @@ class TestPlaylistExtractor(unittest.TestCase):
         self.assertEqual(len(tracks), 1)
         self.assertEqual(tracks[0]["track"]["name"], "Track 1")
 
+    @patch("spotipy.Spotify")
+    def test_get_playlist_tracks_parallel_pages(self, mock_spotify):
+        def page(playlist_id, fields=None, offset=0, limit=2):
+            items = [{"track": {"name": f"Track {i}"}} for i in range(offset, min(offset + limit, 5))]
+            return {"items": items, "next": "more" if offset + limit < 5 else None,
+                    "total": 5, "limit": limit, "offset": offset}
+        mock_spotify.return_value.playlist_tracks.side_effect = page
+        sp = mock_spotify()
+        tracks = get_playlist_tracks(sp, "12345abcde", workers=3)
+        self.assertEqual([t["track"]["name"] for t in tracks], [f"Track {i}" for i in range(5)])
+        sp.next.assert_not_called()
+
     def test_ms_to_min_sec(self):
         self.assertEqual(ms_to_min_sec(123456), "2:03")
         self.assertEqual(ms_to_min_sec(60000), "1:00")
@@ -65,7 +121,7 @@ class TestPlaylistExtractor(unittest.TestCase):
         self.assertEqual(data["artist"], "Artist 1")
         self.assertEqual(data["time"], "3:00")
 
-    @patch("playlist_extractor.spotipy.Spotify")
+    @patch("spotipy.Spotify")
     def test_process_playlist(self, mock_spotify):
         mock_spotify.return_value.playlist.return_value = {"name": "Test Playlist"}
         mock_spotify.return_value.playlist_tracks.return_value = {
@@ -77,5 +133,224 @@ class TestPlaylistExtractor(unittest.TestCase):
         self.assertEqual(len(track_data), 1)
         self.assertEqual(track_data[0]["track"], "Track 1")
 
+    @patch("spotipy.Spotify")
+    def test_process_playlist_lean_reuses_embedded_tracks(self, mock_spotify):
+        track = {"track": {"name": "Track 1", "album": {"name": "Album 1"}, "artists": [{"name": "Artist 1"}], "duration_ms": 180000}}
+        mock_spotify.return_value.playlist.return_value = {
+            "name": "Test Playlist",
+            "tracks": {"items": [track], "next": None, "total": 1, "limit": 100, "offset": 0},
+        }
+        sp = mock_spotify()
+        cache = {}
+        track_data = process_playlist(sp, "spotify:playlist:12345abcde", "Author", "Folder", 2023, metadata_cache=cache)
+        self.assertEqual(track_data[0]["track"], "Track 1")
+        sp.playlist_tracks.assert_not_called()
+
+        # Metadata is cached for the run, without the embedded tracks page
+        metadata = get_playlist_metadata(sp, "12345abcde", fields=PLAYLIST_FIELDS, cache=cache)
+        self.assertEqual(metadata, {"name": "Test Playlist"})
+        sp.playlist.assert_called_once_with("12345abcde", fields=PLAYLIST_FIELDS)
+
+    @patch("spotipy.Spotify")
+    def test_get_playlist_tracks_lean_pages_keep_fields(self, mock_spotify):
+        sp = mock_spotify()
+        sp.playlist_tracks.return_value = {"items": [{"track": {"name": "Track 2"}}], "next": None}
+        first_page = {"items": [{"track": {"name": "Track 1"}}], "next": "more", "total": 2, "limit": 1, "offset": 0}
+        tracks = get_playlist_tracks(sp, "12345abcde", first_page=first_page, fields=TRACK_PAGE_FIELDS)
+        self.assertEqual(len(tracks), 2)
+        sp.playlist_tracks.assert_called_once_with("12345abcde", fields=TRACK_PAGE_FIELDS, offset=1, limit=1)
+
+
+    def test_mongo_sink_upserts_on_ingest_key(self):
+        collection = MagicMock()
+        collection.bulk_write.return_value.upserted_count = 1
+        collection.bulk_write.return_value.matched_count = 1
+        collection.bulk_write.return_value.modified_count = 0
+        collection.bulk_write.return_value.deleted_count = 0
+        track = {
+            "track": {
+                "name": "Track 1",
+                "album": {"name": "Album 1"},
+                "artists": [{"name": "Artist 1"}],
+                "duration_ms": 180000,
+            }
+        }
+        rows = [extract_track_data(track, "Author", "Playlist", "Folder", "2023", i) for i in range(2)]
+        sink = MongoSink(collection, batch_size=10)
+        sink.write(rows)
+        summary = sink.close()
+
+        collection.bulk_write.assert_called_once()
+        ops, kwargs = collection.bulk_write.call_args
+        op = ops[0][0]
+        self.assertFalse(kwargs["ordered"])
+        self.assertEqual(op._filter, {"year": "2023", "playlistFolder": "Folder", "playlist": "Playlist", "trackNumber": 0})
+        self.assertEqual(apply_pipeline({**op._filter}, op._doc),
+                         {**{field: rows[0][field] for field in TrackRow.FIELDS}, "genreStatus": "missing"})
+        self.assertTrue(op._upsert)
+        self.assertEqual(summary, "Ingested into MongoDB: 1 inserted, 0 updated, 1 unchanged, 0 deleted")
+
+    def test_mongo_sink_requeues_reordered_tracks(self):
+        def row(name, number):
+            track = {"track": {"name": name, "album": {"name": "Album"}, "artists": [{"name": f"{name} Artist"}],
+                               "duration_ms": 180000}}
+            return extract_track_data(track, "Author", "Playlist", "Folder", "2023", number)
+
+        def doc(row, **fields):
+            return {**{field: row[field] for field in TrackRow.FIELDS}, **fields}
+
+        # Stored by an earlier ingest, and since enriched
+        stored = [doc(row(name, i), genre=f"{name} Genre") for i, name in enumerate(["A", "B", "C"])]
+        collection = MagicMock()
+        sink = MongoSink(collection, batch_size=10)
+        # Re-ingested after B was moved to the top and C was removed
+        rows = [row("B", 0), row("A", 1)]
+        sink.write(rows)
+        sink.end_playlist(rows[-1], len(rows))
+        sink.flush()
+
+        *updates, delete = collection.bulk_write.call_args[0][0]
+        self.assertEqual([apply_pipeline(dict(stored_doc), op._doc) for stored_doc, op in zip(stored, updates)], [
+            doc(rows[0], genreStatus="missing"),
+            doc(rows[1], genreStatus="missing"),
+        ])
+        unchanged = apply_pipeline(dict(stored[0]), MongoSink.row_update(row("A", 0)))
+        self.assertEqual(unchanged, stored[0])
+        self.assertIsInstance(delete, DeleteMany)
+        self.assertEqual(delete._filter, {"year": "2023", "playlistFolder": "Folder", "playlist": "Playlist",
+                                          "trackNumber": {"$gte": 2}})
+
+
+    @patch("playlist_extractor.iter_playlist_rows")
+    @patch("spotipy.Spotify")
+    def test_extract_folder_incremental_skips_unchanged(self, mock_spotify, mock_process):
+        sp = mock_spotify()
+        sp.playlist.side_effect = lambda playlist_id, fields=None: {"snapshot_id": f"snap-{playlist_id}-new"}
+        mock_process.return_value = iter([[{"track": "Track 1"}]])
+        data = {
+            "name": "Folder",
+            "year": "2023",
+            "children": [
+                {"type": "playlist", "author": "A", "uri": "spotify:playlist:aaa"},
+                {"type": "playlist", "author": "B", "uri": "spotify:playlist:bbb"},
+            ],
+        }
+        snapshots = {"aaa": "snap-aaa-new", "bbb": "snap-bbb-old"}
+        sink = MagicMock()
+        count = extract_folder(sp, data, sink, snapshots=snapshots)
+
+        self.assertEqual(count, 1)
+        mock_process.assert_called_once()
+        self.assertEqual(mock_process.call_args[0][1], "spotify:playlist:bbb")
+        self.assertEqual(snapshots, {"aaa": "snap-aaa-new", "bbb": "snap-bbb-new"})
+
+    @patch("playlist_extractor.iter_playlist_rows")
+    def test_extract_folder_bounds_concurrent_requests(self, mock_rows):
+        mock_rows.side_effect = lambda *args, **kwargs: iter([])
+        children = [{"type": "playlist", "author": "A", "uri": f"spotify:playlist:p{i}"} for i in range(3)]
+        extract_folder(MagicMock(), {"name": "Folder", "year": "2023", "children": children}, MagicMock(), workers=4)
+        # Playlists run in parallel, so each fetches its pages one at a time
+        self.assertEqual({call.kwargs["workers"] for call in mock_rows.call_args_list}, {1})
+
+        mock_rows.reset_mock()
+        extract_folder(MagicMock(), {"name": "Folder", "year": "2023", "children": children[:1]}, MagicMock(), workers=4)
+        self.assertEqual(mock_rows.call_args.kwargs["workers"], 4)
+
+
+    def test_find_folder_files(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in ["2023.json", "2024.json", "2024.csv.snapshots.json", "notes.txt"]:
+                open(os.path.join(tmpdir, name), "w").close()
+            expected = [os.path.join(tmpdir, "2023.json"), os.path.join(tmpdir, "2024.json")]
+            self.assertEqual(find_folder_files([tmpdir]), expected)
+            self.assertEqual(find_folder_files([os.path.join(tmpdir, "*.json"), expected[0]]), expected)
+
+    @patch("playlist_extractor.extract_folder")
+    def test_incremental_state_is_kept_per_output(self, mock_extract):
+        def extract(sp, data, sink, snapshots=None, **kwargs):
+            seen.append(dict(snapshots))
+            snapshots["aaa"] = "snap-aaa"
+            return 0
+
+        seen = []
+        mock_extract.side_effect = extract
+        with tempfile.TemporaryDirectory() as tmpdir:
+            json_file = os.path.join(tmpdir, "2023.json")
+            with open(json_file, "w") as f:
+                json.dump({"type": "folder", "name": os.path.join(tmpdir, "Folder"), "year": "2023",
+                           "children": []}, f)
+            extract_folder_file(MagicMock(), json_file, incremental=True)
+            extract_folder_file(MagicMock(), json_file, collection=MagicMock(), incremental=True)
+            extract_folder_file(MagicMock(), json_file, incremental=True)
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, "2023.ingest.snapshots.json")))
+        self.assertEqual(seen, [{}, {}, {"aaa": "snap-aaa"}])
+
+
+    def test_arrow_sink_writes_typed_parquet(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest("pyarrow not installed")
+        track = {"track": {"name": "Track 1", "album": {"name": "Album 1"},
+                           "artists": [{"name": "Artist 1"}], "duration_ms": 180000}}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "Folder_tracks.parquet")
+            sink = ArrowSink(path)
+            sink.write([extract_track_data(track, "Author", "P1", "Folder", 2023, i) for i in range(2)])
+            sink.write([])
+            sink.write([extract_track_data(track, "Author", "P2", "Folder", 2023, 0)])
+            self.assertEqual(sink.close(), f"Saved 3 tracks to {path}")
+
+            table = pq.read_table(path)
+            self.assertEqual(table.num_rows, 3)
+            self.assertEqual(table.schema.field("trackNumber").type, pa.int32())
+            self.assertTrue(pa.types.is_dictionary(table.schema.field("playlist").type))
+            self.assertEqual(table.column("year").to_pylist(), ["2023"] * 3)
+            self.assertEqual(table.column("genreStatus").to_pylist(), ["missing"] * 3)
+            self.assertEqual(pq.ParquetFile(path).num_row_groups, 1)
+
+    def test_arrow_sink_buffers_pages_into_row_groups(self):
+        import pyarrow.parquet as pq
+
+        track = {"track": {"name": "Track 1", "album": {"name": "Album 1"},
+                           "artists": [{"name": "Artist 1"}], "duration_ms": 180000}}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "Folder_tracks.parquet")
+            sink = ArrowSink(path, row_group_size=4)
+            for page in range(5):
+                sink.write([extract_track_data(track, "Author", "P1", "Folder", 2023, page * 2 + i) for i in range(2)])
+            sink.close()
+
+            parquet_file = pq.ParquetFile(path)
+            self.assertEqual([parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)],
+                             [4, 4, 2])
+            self.assertEqual(parquet_file.read().column("trackNumber").to_pylist(), list(range(10)))
+
+
+    @patch("spotipy.Spotify")
+    def test_iter_playlist_pages_is_lazy(self, mock_spotify):
+        sp = mock_spotify()
+        sp.playlist_tracks.return_value = {"items": [{"track": {"name": "Track 2"}}], "next": None}
+        first_page = {"items": [{"track": {"name": "Track 1"}}], "next": "more", "total": 3, "limit": 1, "offset": 0}
+        pages = iter_playlist_pages(sp, "12345abcde", first_page=first_page, fields=TRACK_PAGE_FIELDS)
+        self.assertIs(next(pages), first_page)
+        sp.playlist_tracks.assert_not_called()
+        self.assertEqual(len(list(pages)), 2)
+
+    def test_csv_sink_streams_rows(self):
+        track = {"track": {"name": "Track 1", "album": {"name": "Album 1"},
+                           "artists": [{"name": "Artist 1"}], "duration_ms": 180000}}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "Folder_tracks.csv")
+            sink = CsvSink(path)
+            sink.write([extract_track_data(track, "Author", "Playlist", "Folder", 2023, 0)])
+            self.assertEqual(sink.close(), f"Saved 1 tracks to {path}")
+            with open(path) as f:
+                lines = f.read().splitlines()
+        self.assertEqual(lines[0], ",".join(TrackRow.FIELDS + ("genreStatus",)))
+        self.assertEqual(lines[1], "2023,Folder,Playlist,Track 1,Album 1,Artist 1,,180000,3:00,,0,Author,missing")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+
+from bson import ObjectId
+
+from run_journal import RunJournal
+
+
+class TestRunJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "journal.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_watermark_survives_restart(self):
+        last_id = ObjectId()
+        journal = RunJournal(self.path)
+        self.assertIsNone(journal.resume_after())
+        journal.checkpoint(last_id)
+
+        self.assertEqual(RunJournal(self.path).resume_after(), last_id)
+
+    def test_reset_keeps_track_history(self):
+        journal = RunJournal(self.path)
+        journal.record([1], "unknown")
+        journal.checkpoint(1)
+        journal.reset()
+        self.assertIsNone(journal.resume_after())
+        self.assertEqual(journal.tracks["1"]["attempts"], 1)
+
+    def test_resume_requires_the_same_filters(self):
+        journal = RunJournal(self.path)
+        journal.reset({"status": ["missing"], "year": "2023"})
+        journal.checkpoint(ObjectId())
+
+        journal = RunJournal(self.path)
+        self.assertIsNotNone(journal.resume_after({"status": ["missing"], "year": "2023"}))
+        with self.assertRaises(ValueError):
+            journal.resume_after({"status": ["missing"], "year": "2024"})
+
+    def test_watch_token_survives_restart(self):
+        journal = RunJournal(self.path)
+        journal.record_watch_token({"_data": "8263"})
+        journal.save()
+        journal = RunJournal(self.path)
+        journal.reset()
+        self.assertEqual(journal.watch_token, {"_data": "8263"})
+
+    def test_skips_tracks_that_failed_repeatedly(self):
+        journal = RunJournal(self.path, max_attempts=2, retry_after=60)
+        journal.record(["a", "b"], "unknown")
+        journal.record(["a"], "error")
+        journal.record(["c", "c"], "resolved")
+        self.assertTrue(journal.should_skip("a"))
+        self.assertFalse(journal.should_skip("b"))
+        self.assertFalse(journal.should_skip("c"))
+        # Old failures become eligible again
+        last = journal.tracks["a"]["last_attempt"]
+        self.assertFalse(journal.should_skip("a", now=last + 61))
+
+    def test_only_failed_tracks_are_kept(self):
+        journal = RunJournal(self.path)
+        journal.record(["a", "b"], "unknown")
+        journal.record(["a"], "resolved")
+        journal.record(["b"], "deferred")
+        journal.record(["c"], "inferred")
+        self.assertEqual(list(journal.tracks), ["b"])
+        self.assertEqual(journal.tracks["b"]["attempts"], 1)
+
+    def test_unchanged_journal_is_not_rewritten(self):
+        journal = RunJournal(self.path)
+        journal.record(["a"], "resolved")
+        journal.save()
+        self.assertFalse(os.path.exists(self.path))
+        journal.record(["a"], "error")
+        journal.save()
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_deferred_tracks_are_never_skipped(self):
+        journal = RunJournal(self.path, max_attempts=2, retry_after=60)
+        journal.record(["a"], "deferred")
+        journal.record(["a"], "deferred")
+        self.assertFalse(journal.should_skip("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
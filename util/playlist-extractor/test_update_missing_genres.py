@@ -0,0 +1,365 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from unittest.mock import patch, MagicMock
+
+os.environ.setdefault("LASTFM_API_KEY", "test-key")
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017/test")
+
+from update_missing_genres import (
+    group_by_artist,
+    resolve_artist,
+    plan_updates,
+    iter_tracks_with_missing_genres,
+    BulkWriter,
+    GenreIndex,
+    infer_genres,
+    has_missing_genre,
+    watch_missing_genres,
+    poll_missing_genres,
+    queue_new_tracks,
+    main,
+)
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from get_genre_search import LastfmFatalError, LookupStats
+from run_journal import RunJournal
+
+
+def doc(_id, artist, track):
+    return {"_id": _id, "artist": artist, "track": track}
+
+
+class TestArtistPlanner(unittest.TestCase):
+
+    def test_group_by_artist_merges_spellings(self):
+        groups = group_by_artist([
+            doc(1, "Prince", "Kiss"),
+            doc(2, "prince ", "kiss"),
+            doc(3, "Prince", "1999"),
+        ])
+        self.assertEqual(list(groups), ["Prince"])
+        self.assertEqual([d["_id"] for d in groups["Prince"]["Kiss"]], [1, 2])
+        self.assertEqual(list(groups["Prince"]), ["Kiss", "1999"])
+
+    @patch("update_missing_genres.get_genre")
+    @patch("update_missing_genres.lastfm_artist_tags")
+    def test_unambiguous_artist_skips_track_lookups(self, mock_tags, mock_get_genre):
+        mock_tags.return_value = ["jazz", "bebop", "seen live"]
+        genres = resolve_artist("Miles Davis", ["So What", "Freddie Freeloader"])
+        self.assertEqual(genres, {"So What": "Jazz", "Freddie Freeloader": "Jazz"})
+        mock_get_genre.assert_not_called()
+
+    @patch("update_missing_genres.lastfm_artist_tags")
+    def test_unambiguous_artist_is_counted_as_artist_batch(self, mock_tags):
+        mock_tags.return_value = ["jazz"]
+        stats = LookupStats()
+        with patch("update_missing_genres.LOOKUP_STATS", stats):
+            resolve_artist("Miles Davis", ["So What", "Blue in Green"])
+        self.assertEqual(stats.as_dict()["tiers"]["artist_batch"]["tracks"], 2)
+
+    @patch("update_missing_genres.get_genre")
+    @patch("update_missing_genres.lastfm_artist_tags")
+    def test_ambiguous_artist_reuses_artist_tags(self, mock_tags, mock_get_genre):
+        mock_tags.return_value = ["rock", "electronic"]
+        mock_get_genre.return_value = "Electronic"
+        genres = resolve_artist("Radiohead", ["Idioteque"])
+        self.assertEqual(genres, {"Idioteque": "Electronic"})
+        mock_get_genre.assert_called_once_with("Radiohead", "Idioteque", artist_tags=["rock", "electronic"],
+                                               hedged=False)
+
+    @patch("update_missing_genres.get_genre", return_value="Electronic")
+    @patch("get_genre_search.LASTFM_CLIENT")
+    def test_ambiguous_artist_tags_call_is_counted(self, mock_client, _):
+        mock_client.get.return_value = {"toptags": {"tag": [{"name": "rock"}, {"name": "electronic"}]}}
+        stats = LookupStats()
+        with patch("update_missing_genres.LOOKUP_STATS", stats):
+            resolve_artist("Radiohead", ["Idioteque"])
+        self.assertEqual(stats.as_dict()["tiers"]["artist_prefetch"],
+                         {"tracks": 0, "calls": 1, "calls_per_track": None})
+
+    @patch("update_missing_genres.lastfm_artist_tags")
+    def test_plan_updates_groups_ids_by_genre(self, mock_tags):
+        mock_tags.side_effect = lambda artist: {"A": ["punk"], "B": []}[artist]
+        with patch("update_missing_genres.get_genre", return_value="Unknown"):
+            plan = dict(plan_updates([doc(1, "A", "x"), doc(2, "B", "y"), doc(3, "A", "z")], workers=2))
+        self.assertEqual(plan, {"A": {"Rock/Pop": [1, 3]}, "B": {"Unknown": [2]}})
+        self.assertEqual(mock_tags.call_count, 2)
+
+
+class TestStreamingPipeline(unittest.TestCase):
+
+    def test_iter_tracks_yields_batches(self):
+        collection = MagicMock()
+        cursor = collection.find.return_value.sort.return_value.batch_size.return_value
+        cursor.__iter__.return_value = iter([doc(i, "A", str(i)) for i in range(5)])
+        batches = list(iter_tracks_with_missing_genres(collection, 2))
+        self.assertEqual([len(b) for b in batches], [2, 2, 1])
+
+    def test_bulk_writer_flushes_by_size(self):
+        collection = MagicMock()
+        collection.bulk_write.return_value.matched_count = 2
+        collection.bulk_write.return_value.modified_count = 2
+        writer = BulkWriter(collection, max_ops=2, max_interval=60)
+        writer.add("Jazz", [1])
+        collection.bulk_write.assert_not_called()
+        writer.add("Rock/Pop", [2])
+        self.assertEqual(collection.bulk_write.call_count, 1)
+        ops = collection.bulk_write.call_args[0][0]
+        self.assertEqual(ops[0]._filter, {"_id": {"$in": [1]}})
+        self.assertFalse(collection.bulk_write.call_args[1]["ordered"])
+        writer.close()
+        self.assertEqual(collection.bulk_write.call_count, 1)
+        self.assertEqual(writer.modified, 2)
+
+    def test_bulk_writer_flushes_by_age(self):
+        collection = MagicMock()
+        writer = BulkWriter(collection, max_ops=100, max_interval=0)
+        writer.add("Jazz", [1])
+        collection.bulk_write.assert_called_once()
+
+class TestGenreInference(unittest.TestCase):
+
+    def setUp(self):
+        self.collection = MagicMock()
+        self.collection.aggregate.return_value = [
+            {"_id": {"artist": "Prince", "album": "Purple Rain", "genre": "Rock/Pop"}, "count": 5},
+            {"_id": {"artist": "Prince", "album": "Sign o' the Times", "genre": "R&B/Soul"}, "count": 6},
+            {"_id": {"artist": "Miles Davis", "album": "Kind of Blue", "genre": "Jazz"}, "count": 4},
+        ]
+        self.index = GenreIndex.from_collection(self.collection, threshold=0.6)
+
+    def test_index_is_built_with_one_aggregation(self):
+        self.collection.aggregate.assert_called_once()
+        self.assertEqual(self.index.artists["prince"], {"Rock/Pop": 5, "R&B/Soul": 6})
+
+    def test_album_votes_win_over_artist_votes(self):
+        self.assertEqual(self.index.infer("prince", "PURPLE RAIN"), "Rock/Pop")
+        self.assertEqual(self.index.infer("Miles Davis", "Bitches Brew"), "Jazz")
+
+    def test_split_votes_below_threshold_are_not_inferred(self):
+        self.assertIsNone(self.index.infer("Prince", "Lovesexy"))
+        self.assertIsNone(self.index.infer("Nobody"))
+
+    def test_infer_genres_returns_leftovers(self):
+        tracks = [
+            {"_id": 1, "artist": "Miles Davis", "album": "Kind of Blue"},
+            {"_id": 2, "artist": "Prince", "album": "Lovesexy"},
+            {"_id": 3, "artist": "Miles Davis"},
+        ]
+        inferred, leftovers = infer_genres(tracks, self.index)
+        self.assertEqual(inferred, {"Jazz": [1, 3]})
+        self.assertEqual([doc["_id"] for doc in leftovers], [2])
+
+
+class TestWatchMode(unittest.TestCase):
+
+    def test_has_missing_genre(self):
+        self.assertTrue(has_missing_genre({"_id": 1}))
+        self.assertTrue(has_missing_genre({"_id": 1, "genre": " "}))
+        self.assertFalse(has_missing_genre({"_id": 1, "genre": "Jazz"}))
+        self.assertFalse(has_missing_genre({"_id": 1, "genre": "error"}))
+
+    def test_change_stream_batches_by_size_and_skips_resolved_tracks(self):
+        changes = [
+            {"fullDocument": {"_id": 1, "artist": "A", "track": "x", "genre": ""}},
+            {"fullDocument": {"_id": 2, "artist": "B", "track": "y", "genre": "Jazz"}},
+            None,
+            {"fullDocument": {"_id": 1, "artist": "A", "track": "x", "genre": "", "extra": True}},
+            {"fullDocument": {"_id": 3, "artist": "C", "track": "z"}},
+        ]
+        collection = MagicMock()
+        stream = collection.watch.return_value.__enter__.return_value = collection.watch.return_value
+        stream.try_next.side_effect = changes
+        batch = next(watch_missing_genres(collection, batch_size=2, max_wait=60))
+        self.assertEqual([doc["_id"] for doc in batch], [1, 3])
+        self.assertNotIn("extra", batch[0])
+
+    def test_change_stream_resumes_from_the_saved_token(self):
+        collection = MagicMock()
+        stream = collection.watch.return_value.__enter__.return_value = collection.watch.return_value
+        stream.try_next.side_effect = [{"fullDocument": {"_id": 1, "artist": "A", "track": "x"}},
+                                       {"fullDocument": {"_id": 2, "artist": "B", "track": "y"}}]
+        stream.resume_token = {"_data": "after-1"}
+        saved = []
+        batches = watch_missing_genres(collection, batch_size=1, max_wait=60, resume_token={"_data": "old"},
+                                       save_resume_token=saved.append)
+        next(batches)
+        self.assertEqual(collection.watch.call_args.kwargs["resume_after"], {"_data": "old"})
+        # The token is only saved once the batch has been processed
+        self.assertEqual(saved, [])
+        next(batches)
+        self.assertEqual(saved, [{"_data": "after-1"}])
+
+    def test_lost_resume_token_watches_from_now(self):
+        collection = MagicMock()
+        stream = MagicMock()
+        stream.__enter__.return_value = stream
+        stream.try_next.side_effect = [{"fullDocument": {"_id": 1, "artist": "A", "track": "x"}}]
+        collection.watch.side_effect = [OperationFailure("resume point no longer in oplog", code=286), stream]
+        with redirect_stdout(io.StringIO()):
+            batch = next(watch_missing_genres(collection, batch_size=1, resume_token={"_data": "old"}))
+        self.assertEqual([d["_id"] for d in batch], [1])
+        self.assertNotIn("resume_after", collection.watch.call_args.kwargs)
+        collection.find.assert_not_called()
+
+    @patch("update_missing_genres.time.sleep")
+    def test_falls_back_to_polling_after_the_newest_track(self, mock_sleep):
+        collection = MagicMock()
+        collection.watch.side_effect = OperationFailure("not a replica set", code=40573)
+        collection.find_one.return_value = {"_id": 10}
+        cursor = collection.find.return_value.sort.return_value.limit
+        cursor.side_effect = [[], [doc(11, "A", "x"), doc(12, "B", "y")]]
+        batch = next(watch_missing_genres(collection, batch_size=2, poll_interval=1))
+        self.assertEqual([d["_id"] for d in batch], [11, 12])
+        query = collection.find.call_args[0][0]
+        self.assertEqual(query["_id"], {"$gt": 10})
+        mock_sleep.assert_called_once_with(1)
+
+    @patch("update_missing_genres.time.sleep")
+    def test_polling_advances_the_watermark(self, mock_sleep):
+        collection = MagicMock()
+        collection.find.return_value.sort.return_value.limit.side_effect = [[doc(5, "A", "x")], [doc(6, "B", "y")]]
+        batches = poll_missing_genres(collection, batch_size=10, after_id=4)
+        next(batches)
+        next(batches)
+        self.assertEqual(collection.find.call_args[0][0]["_id"], {"$gt": 5})
+
+    @patch("update_missing_genres.time.sleep")
+    def test_polling_finds_tracks_without_a_status(self, mock_sleep):
+        collection = MagicMock()
+        collection.find.return_value.sort.return_value.limit.return_value = [doc(5, "A", "x")]
+        next(poll_missing_genres(collection, batch_size=10, after_id=4))
+        query = collection.find.call_args[0][0]
+        self.assertNotIn("genreStatus", query)
+        self.assertIn({"genre": {"$exists": False}}, query["$or"])
+
+    def test_tracks_without_a_status_are_queued(self):
+        collection = MagicMock()
+        collection.update_many.return_value.modified_count = 1
+        tracks = [
+            {"_id": 1, "genre": ""},
+            {"_id": 2, "genre": "Unknown"},
+            {"_id": 3, "genre": "", "genreStatus": "missing"},
+            {"_id": 4, "genre": "Jazz"},
+        ]
+        self.assertEqual(queue_new_tracks(collection, tracks), 2)
+        updates = [c[0] for c in collection.update_many.call_args_list]
+        self.assertEqual([(q["_id"], u) for q, u in updates], [
+            ({"$in": [1]}, {"$set": {"genreStatus": "missing"}}),
+            ({"$in": [2]}, {"$set": {"genreStatus": "unknown"}}),
+        ])
+        self.assertEqual(updates[1][0]["genre"], {"$in": ["Unknown", "unknown"]})
+        self.assertEqual(updates[1][0]["genreStatus"], {"$exists": False})
+
+
+# The journal filters of a run without --status or --year
+DEFAULT_FILTERS = {"status": ["missing", "unknown"], "year": None}
+
+
+class TestMain(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.journal = os.path.join(self.tmpdir.name, "journal.json")
+        self.client, self.collection = MagicMock(), MagicMock()
+        for target, value in [
+            ("update_missing_genres.connect_to_mongodb", (self.client, self.collection)),
+            ("update_missing_genres.ensure_queue_index", 0),
+            ("update_missing_genres.configure_client", None),
+            ("update_missing_genres.get_api_key", "test-key"),
+        ]:
+            patch(target, return_value=value).start()
+        self.addCleanup(patch.stopall)
+
+    def run_main(self, *args, infer=False):
+        argv = ["--no-cache", "--no-summaries", "--journal", self.journal, *args]
+        if not infer:
+            argv.append("--no-infer")
+        with redirect_stdout(io.StringIO()):
+            main(argv)
+
+    @patch("update_missing_genres.plan_updates")
+    @patch("update_missing_genres.find_tracks_with_missing_genres")
+    def test_interrupted_run_resumes_after_last_checkpointed_slice(self, mock_find, mock_plan):
+        ids = sorted(ObjectId() for _ in range(5))
+        mock_find.return_value = [doc(_id, "A", str(i)) for i, _id in enumerate(ids)]
+        slices = []
+
+        def plan(tracks, workers, hedged=False):
+            slices.append([d["_id"] for d in tracks])
+            if len(slices) == 3:
+                raise KeyboardInterrupt
+            return iter([])
+
+        mock_plan.side_effect = plan
+        self.run_main("--batch-size", "2")
+        self.assertEqual(slices, [ids[0:2], ids[2:4], ids[4:]])
+        self.assertEqual(RunJournal(self.journal).resume_after(DEFAULT_FILTERS), ids[3])
+
+    @patch("update_missing_genres.plan_updates", return_value=iter([]))
+    @patch("update_missing_genres.watch_missing_genres")
+    def test_watch_batches_do_not_move_the_resume_watermark(self, mock_watch, _):
+        backlog_id, watched_id = sorted(ObjectId() for _ in range(2))
+        journal = RunJournal(self.journal)
+        journal.reset(DEFAULT_FILTERS)
+        journal.checkpoint(backlog_id)
+        mock_watch.return_value = iter([[doc(watched_id, "A", "1")]])
+
+        self.run_main("--watch")
+        self.assertEqual(RunJournal(self.journal).resume_after(DEFAULT_FILTERS), backlog_id)
+
+    @patch("update_missing_genres.GenreIndex.from_collection")
+    @patch("update_missing_genres.plan_updates")
+    @patch("update_missing_genres.watch_missing_genres")
+    def test_watch_infers_from_genres_it_resolved(self, mock_watch, mock_plan, mock_index):
+        mock_index.return_value = GenreIndex(threshold=0.6)
+        ids = sorted(ObjectId() for _ in range(2))
+        mock_watch.return_value = iter([[doc(ids[0], "A", "1")], [doc(ids[1], "A", "2")]])
+        lookups = []
+
+        def plan(tracks, workers, hedged=False):
+            lookups.append([d["_id"] for d in tracks])
+            return iter([("A", {"Rock": [d["_id"] for d in tracks]})])
+
+        mock_plan.side_effect = plan
+        self.run_main("--watch", infer=True)
+        self.assertEqual(lookups, [[ids[0]], []])
+        self.assertEqual(mock_index.return_value.infer("A"), "Rock")
+
+    @patch("update_missing_genres.find_tracks_with_missing_genres")
+    def test_resume_with_other_filters_is_refused(self, mock_find):
+        journal = RunJournal(self.journal)
+        journal.reset({"status": ["missing", "unknown"], "year": "2023"})
+        journal.checkpoint(ObjectId())
+
+        with self.assertRaises(SystemExit):
+            self.run_main("--resume", "--year", "2024")
+        mock_find.assert_not_called()
+
+    @patch("update_missing_genres.plan_updates")
+    @patch("update_missing_genres.find_tracks_with_missing_genres")
+    def test_rejected_api_key_stops_the_run(self, mock_find, mock_plan):
+        ids = sorted(ObjectId() for _ in range(4))
+        mock_find.return_value = [doc(_id, "A", str(i)) for i, _id in enumerate(ids)]
+        mock_plan.side_effect = [iter([("A", {"Rock": ids[:2]})]), LastfmFatalError("Last.fm error 10")]
+
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            self.run_main("--batch-size", "2")
+        self.assertEqual(mock_plan.call_count, 2)
+        self.assertEqual(RunJournal(self.journal).resume_after(DEFAULT_FILTERS), ids[1])
+
+    @patch("update_missing_genres.get_api_key", side_effect=SystemExit("ERROR: LASTFM_API_KEY missing in .env"))
+    @patch("update_missing_genres.connect_to_mongodb")
+    def test_missing_api_key_exits_before_connecting(self, mock_connect, _):
+        with self.assertRaises(SystemExit):
+            self.run_main()
+        mock_connect.assert_not_called()
+        self.assertFalse(os.path.exists(self.journal))
+
+
+if __name__ == "__main__":
+    unittest.main()
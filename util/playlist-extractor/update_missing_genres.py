@@ -5,27 +5,59 @@ Queries MongoDB for tracks with empty/null genres and looks up genre information
 """
 import os
 import sys
-from dotenv import load_dotenv
-from pymongo import MongoClient
-from get_genre_search import get_genre
-
-# Load environment variables
-load_dotenv()
-
-MONGODB_URI = os.getenv("MONGODB_URI")
-LASTFM_API_KEY = os.getenv("LASTFM_API_KEY")
-
-if not MONGODB_URI:
-    raise SystemExit("ERROR: MONGODB_URI missing in .env")
-
-if not LASTFM_API_KEY:
-    raise SystemExit("ERROR: LASTFM_API_KEY missing in .env")
+import time
+import argparse
+from get_genre_search import (
+    get_genre,
+    lastfm_artist_tags,
+    run_concurrently,
+    counting_calls,
+    configure_cache,
+    configure_client,
+    get_api_key,
+    LastfmFatalError,
+    LastfmUnavailable,
+    GENRE_MATCHER,
+    LOOKUP_STATS,
+    LASTFM_LIMITER,
+    DEFAULT_WORKERS,
+    LASTFM_RPS,
+)
+from run_journal import RunJournal, DEFAULT_JOURNAL_PATH
+from genre_status import (
+    genre_status,
+    genre_query,
+    status_update,
+    queue_query,
+    ensure_queue_index,
+    backfill,
+    STATUSES,
+    DEFAULT_STATUSES,
+    STATUS_FIELD,
+)
+from materialize_summaries import materialize
+from lastfm_cache import (
+    normalize,
+    DAY,
+    DEFAULT_CACHE_PATH,
+    DEFAULT_TTL,
+    DEFAULT_NEGATIVE_TTL,
+    DEFAULT_MAX_ENTRIES,
+)
 
 
 def connect_to_mongodb():
     """Connect to MongoDB and return the database and collection."""
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    mongodb_uri = os.getenv("MONGODB_URI")
+    if not mongodb_uri:
+        raise SystemExit("ERROR: MONGODB_URI missing in .env")
+
     try:
-        client = MongoClient(MONGODB_URI)
+        client = MongoClient(mongodb_uri)
         # Extract database name from URI or default to 'surflog'
         db = client.get_database()
         collection = db['best']
@@ -34,104 +66,620 @@ def connect_to_mongodb():
         raise SystemExit(f"ERROR: Could not connect to MongoDB: {e}")
 
 
-def find_tracks_with_missing_genres(collection):
-    """Find all tracks with empty, null, unset, or missing genre field."""
-    query = {
-        "$or": [
-            {"genre": {"$exists": False}},
-            {"genre": "Unknown"},
-            {"genre": "None"},
-            {"genre": ""},
-            {"genre": " "},  # Also catch whitespace-only strings
-        ]
-    }
-    #query = {"genre":"error"} # use for specific genre update
-    print(query)
+# Only return fields we need
+TRACK_PROJECTION = {
+    "_id": 1,
+    "track": 1,
+    "artist": 1,
+    "album": 1,
+    "year": 1,
+    "playlist": 1,
+    "genre": 1,
+    STATUS_FIELD: 1,
+}
+
+
+def missing_genre_query(after_id=None, statuses=DEFAULT_STATUSES, year=None):
+    """
+    Build the query for queued tracks (see genre_status.py), optionally
+    limited to a year and to tracks after an _id.
+    """
+    return queue_query(statuses, year=year, after_id=after_id)
 
-    # Only return fields we need
-    projection = {
-        "_id": 1,
-        "track": 1,
-        "artist": 1,
-        "album": 1,
-        "year": 1,
-        "playlist": 1
-    }
-
-    tracks = list(collection.find(query, projection))
+
+def find_tracks_with_missing_genres(collection, after_id=None, statuses=DEFAULT_STATUSES, year=None, limit=None):
+    """Find the tracks queued with the given genre statuses (missing or unknown by default)."""
+    query = missing_genre_query(after_id, statuses, year)
+    print(query)
+    cursor = collection.find(query, TRACK_PROJECTION).sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+    tracks = list(cursor)
     return tracks
 
 
-def get_genre_for_track(artist, track):
-    """Get genre for a track using Last.fm API."""
+def iter_tracks_with_missing_genres(collection, batch_size, after_id=None, statuses=DEFAULT_STATUSES,
+                                    year=None, limit=None):
+    """Stream queued tracks from the cursor in lists of batch_size."""
+    query = missing_genre_query(after_id, statuses, year)
+    print(query)
+    cursor = collection.find(query, TRACK_PROJECTION).sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+    cursor = cursor.batch_size(batch_size)
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+DEFAULT_INFER_THRESHOLD = 0.6
+
+
+class GenreIndex:
+    """
+    Artist -> genre and (artist, album) -> genre votes taken from the tracks
+    in the collection that already have a genre.
+
+    A track with a missing genre gets the majority genre of its album, or
+    failing that of its artist, when that genre holds at least `threshold`
+    of the votes.
+    """
+
+    def __init__(self, threshold=DEFAULT_INFER_THRESHOLD, min_votes=1):
+        self.threshold = threshold
+        self.min_votes = min_votes
+        self.artists = {}  # artist: {genre: votes}
+        self.albums = {}   # (artist, album): {genre: votes}
+
+    def add(self, artist, album, genre, count=1):
+        artist = normalize(artist or "")
+        votes = self.artists.setdefault(artist, {})
+        votes[genre] = votes.get(genre, 0) + count
+        if album:
+            votes = self.albums.setdefault((artist, normalize(album)), {})
+            votes[genre] = votes.get(genre, 0) + count
+
+    @classmethod
+    def from_collection(cls, collection, **options):
+        """Build the index with one aggregation counting tracks per (artist, album, genre)."""
+        index = cls(**options)
+        pipeline = [
+            {"$match": {"$nor": [genre_query()]}},
+            {"$group": {
+                "_id": {"artist": "$artist", "album": "$album", "genre": "$genre"},
+                "count": {"$sum": 1},
+            }},
+        ]
+        for row in collection.aggregate(pipeline, allowDiskUse=True):
+            key = row["_id"]
+            if key.get("artist"):
+                index.add(key["artist"], key.get("album"), key["genre"], row["count"])
+        return index
+
+    def _vote(self, votes):
+        if not votes:
+            return None
+        genre = max(votes, key=votes.get)
+        total = sum(votes.values())
+        if total >= self.min_votes and votes[genre] / total >= self.threshold:
+            return genre
+        return None
+
+    def infer(self, artist, album=None):
+        """Return the inferred genre for a track, or None if the votes are not decisive."""
+        artist = normalize(artist or "")
+        if album:
+            genre = self._vote(self.albums.get((artist, normalize(album))))
+            if genre:
+                return genre
+        return self._vote(self.artists.get(artist))
+
+
+def infer_genres(tracks, index):
+    """
+    Split tracks into ({genre: [track ids]} inferred from `index`, leftovers
+    that still need a Last.fm lookup).
+    """
+    inferred = {}
+    leftovers = []
+    for doc in tracks:
+        genre = index.infer(doc.get('artist'), doc.get('album'))
+        if genre:
+            inferred.setdefault(genre, []).append(doc['_id'])
+        else:
+            leftovers.append(doc)
+    return inferred, leftovers
+
+
+# Change stream events that can leave a track with a missing genre
+WATCH_PIPELINE = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+
+
+def has_missing_genre(doc, statuses=DEFAULT_STATUSES):
+    """The in-memory counterpart of genre_query()."""
+    return genre_status(doc.get("genre")) in statuses
+
+
+def watch_missing_genres(collection, batch_size=100, max_wait=2.0, poll_interval=5.0, after_id=None,
+                         statuses=DEFAULT_STATUSES, resume_token=None, save_resume_token=None):
+    """
+    Yield micro-batches of tracks that get inserted or updated with a missing
+    genre, forever.
+
+    Uses a change stream; a batch is yielded once it holds `batch_size`
+    tracks or its oldest track has waited `max_wait` seconds. Where change
+    streams are not available (a standalone mongod) it falls back to
+    poll_missing_genres().
+
+    The stream continues after `resume_token` when given, so changes made
+    while the worker was down are not missed. Once a batch has been
+    processed (when the next one is requested) `save_resume_token` is
+    called with the stream position after it.
+    """
+    from pymongo.errors import OperationFailure
+
+    options = {"full_document": "updateLookup", "max_await_time_ms": max(1, int(max_wait * 500))}
     try:
-        genre = get_genre(artist, track)
-        if not genre:
-            return "unknown"
-        return genre
-    except Exception as e:
-        print(f"  ERROR fetching genre: {e}", file=sys.stderr)
-        return "error"
+        try:
+            stream = collection.watch(WATCH_PIPELINE, resume_after=resume_token, **options)
+        except OperationFailure as e:
+            if resume_token is None:
+                raise
+            # The token is older than the oplog; a normal run catches up on the gap
+            print(f"Cannot resume the change stream ({e}); watching from now on. "
+                  f"Run without --watch to catch up on missed tracks.")
+            stream = collection.watch(WATCH_PIPELINE, **options)
+    except OperationFailure as e:
+        print(f"Change streams unavailable ({e}); polling for new tracks every {poll_interval:g}s")
+        yield from poll_missing_genres(collection, batch_size, poll_interval, after_id, statuses)
+        return
 
+    print("Watching the change stream for tracks with missing genres")
+    with stream:
+        batch = {}
+        first_queued = None
+        while True:
+            change = stream.try_next()
+            doc = change and change.get("fullDocument")
+            if doc and has_missing_genre(doc, statuses):
+                if not batch:
+                    first_queued = time.monotonic()
+                # Repeated changes to one track only need one lookup
+                batch[doc["_id"]] = {field: doc.get(field) for field in TRACK_PROJECTION if field in doc}
+            if batch and (len(batch) >= batch_size or time.monotonic() - first_queued >= max_wait):
+                token = stream.resume_token
+                yield list(batch.values())
+                if save_resume_token is not None:
+                    save_resume_token(token)
+                batch = {}
+
+
+def poll_missing_genres(collection, batch_size=100, poll_interval=5.0, after_id=None,
+                        statuses=DEFAULT_STATUSES):
+    """
+    Yield batches of tracks with missing genres inserted after an _id
+    watermark, forever. Without `after_id` polling starts after the newest
+    track in the collection. Only catches inserts: existing tracks whose
+    genre is cleared later are left to a normal run.
+
+    Tracks are matched on their genre rather than genreStatus, so inserts
+    made outside these tools (which carry no status) are found as well.
+    """
+    if after_id is None:
+        newest = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        after_id = newest["_id"] if newest else None
+    while True:
+        query = genre_query(statuses)
+        if after_id is not None:
+            query["_id"] = {"$gt": after_id}
+        batch = list(collection.find(query, TRACK_PROJECTION).sort("_id", 1).limit(batch_size))
+        if batch:
+            after_id = batch[-1]["_id"]
+            yield batch
+        if len(batch) < batch_size:
+            time.sleep(poll_interval)
+
+
+def queue_new_tracks(collection, tracks):
+    """
+    Set genreStatus on tracks that arrived without one (inserted by an import
+    outside these tools), so they stay queued whatever their lookup finds.
+    Returns the number of tracks queued.
+    """
+    by_status = {}
+    for doc in tracks:
+        status = genre_status(doc.get("genre"))
+        if status and STATUS_FIELD not in doc:
+            by_status.setdefault(status, []).append(doc["_id"])
+    queued = 0
+    for status, track_ids in by_status.items():
+        # Skip tracks that were resolved or queued in the meantime
+        query = {**genre_query([status]), "_id": {"$in": track_ids}, STATUS_FIELD: {"$exists": False}}
+        queued += collection.update_many(query, {"$set": {STATUS_FIELD: status}}).modified_count
+    return queued
+
+
+def group_by_artist(tracks):
+    """
+    Group track documents by artist, then by track title.
+
+    Returns {artist: {title: [docs]}}. Names are compared case- and
+    whitespace-insensitively; the first spelling seen is kept.
+    """
+    groups = {}
+    names = {}
+    for doc in tracks:
+        artist = doc.get('artist', 'Unknown Artist')
+        title = doc.get('track', 'Unknown Track')
+        artist = names.setdefault(normalize(artist), artist)
+        title = names.setdefault((normalize(artist), normalize(title)), title)
+        groups.setdefault(artist, {}).setdefault(title, []).append(doc)
+    return groups
+
+
+def resolve_artist(artist, titles, hedged=False):
+    """
+    Resolve a genre for every track title by one artist. Returns {title: genre},
+    where genre is None if Last.fm was unavailable for that title.
+
+    Artist tags are fetched once. When every tag that matches a canonical
+    genre matches the same one, track-level tags could not plausibly
+    disagree, so that genre is used for all titles without further
+    lookups. Otherwise each title goes through get_genre() reusing the
+    artist tags (with `hedged`, its remaining tiers run concurrently).
+    """
+    with counting_calls() as calls:
+        artist_tags = lastfm_artist_tags(artist)
+    candidates = GENRE_MATCHER.scores(artist_tags)
+    if len(candidates) == 1:
+        genre = next(iter(candidates))
+        LOOKUP_STATS.record_resolution("artist_batch", calls[0], tracks=len(titles))
+        return {title: genre for title in titles}
+    # The titles' own tiers reuse these tags; count the call so tier calls add up
+    LOOKUP_STATS.record_resolution("artist_prefetch", calls[0], tracks=0)
+
+    genres = {}
+    for title in titles:
+        try:
+            genres[title] = get_genre(artist, title, artist_tags=artist_tags, hedged=hedged) or "unknown"
+        except LastfmUnavailable as e:
+            print(f"  Last.fm unavailable for {artist} - {title}: {e}", file=sys.stderr)
+            genres[title] = None
+        except LastfmFatalError:
+            raise
+        except Exception as e:
+            print(f"  ERROR fetching genre for {artist} - {title}: {e}", file=sys.stderr)
+            genres[title] = "error"
+    return genres
+
+
+def plan_updates(tracks, workers, hedged=False):
+    """
+    Resolve tracks one artist at a time on a worker pool.
+
+    Yields (artist, {genre: [track ids]}) as each artist completes, so each
+    decision can be written with a single update_many.
+    """
+    groups = group_by_artist(tracks)
+    artists = list(groups)
+    jobs = ((artist, list(groups[artist]), hedged) for artist in artists)
+
+    for index, genres in run_concurrently(resolve_artist, jobs, workers):
+        artist = artists[index]
+        titles = groups[artist]
+        if isinstance(genres, LastfmFatalError):
+            raise genres
+        if isinstance(genres, LastfmUnavailable):
+            print(f"  Last.fm unavailable for {artist}: {genres}", file=sys.stderr)
+            genres = {title: None for title in titles}
+        elif isinstance(genres, Exception):
+            print(f"  ERROR fetching genres for {artist}: {genres}", file=sys.stderr)
+            genres = {title: "error" for title in titles}
+
+        decisions = {}
+        for title, docs in titles.items():
+            decisions.setdefault(genres[title], []).extend(doc['_id'] for doc in docs)
+        yield artist, decisions
+
+
+class BulkWriter:
+    """
+    Buffer genre updates and send them as unordered bulk_write batches.
+
+    The buffer is flushed when it holds `max_ops` operations or when the
+    oldest one has waited `max_interval` seconds.
+    """
+
+    def __init__(self, collection, max_ops=500, max_interval=5.0):
+        from pymongo import UpdateMany
+
+        self.UpdateMany = UpdateMany
+        self.collection = collection
+        self.max_ops = max_ops
+        self.max_interval = max_interval
+        self.ops = []
+        self.first_queued = None
+        self.batches = 0
+        self.modified = 0
+        self.errors = 0
+
+    def add(self, genre, track_ids):
+        if not self.ops:
+            self.first_queued = time.monotonic()
+        self.ops.append(self.UpdateMany({"_id": {"$in": track_ids}}, status_update(genre)))
+        if (len(self.ops) >= self.max_ops
+                or time.monotonic() - self.first_queued >= self.max_interval):
+            self.flush()
+
+    def flush(self):
+        """Write out the buffered operations and report the batch result."""
+        from pymongo.errors import BulkWriteError
+
+        if not self.ops:
+            return
+        ops, self.ops = self.ops, []
+        self.batches += 1
+        try:
+            result = self.collection.bulk_write(ops, ordered=False)
+            matched, modified, errors = result.matched_count, result.modified_count, 0
+        except BulkWriteError as e:
+            details = e.details
+            matched, modified = details.get("nMatched", 0), details.get("nModified", 0)
+            errors = len(details.get("writeErrors", []))
+        self.modified += modified
+        self.errors += errors
+        print(f"  Bulk write #{self.batches}: {len(ops)} ops, {matched} matched, "
+              f"{modified} modified, {errors} errors")
+
+    def close(self):
+        self.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Populate missing track genres in MongoDB using Last.fm.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Concurrent Last.fm lookups (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--rps", type=float, default=LASTFM_RPS,
+                        help=f"Maximum Last.fm requests per second (default: {LASTFM_RPS})")
+    parser.add_argument("--hedged", action="store_true",
+                        help="Run each track's Last.fm lookup tiers concurrently: lower tail latency, "
+                             "more requests per track")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH,
+                        help=f"Last.fm response cache file (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--no-cache", action="store_true", help="Always query Last.fm directly")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL / DAY,
+                        help="Days to keep cached responses")
+    parser.add_argument("--negative-ttl", type=float, default=DEFAULT_NEGATIVE_TTL / DAY,
+                        help="Days to keep cached \"nothing found\" responses")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="Maximum number of cached responses")
+    parser.add_argument("--status", nargs="+", choices=STATUSES, default=list(DEFAULT_STATUSES),
+                        help="Genre statuses to work on (default: missing unknown)")
+    parser.add_argument("--year", help="Only work on tracks from this year")
+    parser.add_argument("--limit", type=int, help="Work on at most this many tracks")
+    parser.add_argument("--rebuild-queue", action="store_true",
+                        help="Recompute genreStatus for every track (after genres were edited by other tools)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and resolve newly inserted or updated tracks as they arrive")
+    parser.add_argument("--watch-wait", type=float, default=2.0,
+                        help="In --watch mode, seconds a new track may wait for its batch to fill (default: 2)")
+    parser.add_argument("--poll-interval", type=float, default=5.0,
+                        help="In --watch mode without change streams, seconds between polls (default: 5)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read the backlog from the cursor in batches instead of all at once")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Tracks per batch; progress is checkpointed after each one (default: 1000)")
+    parser.add_argument("--flush-size", type=int, default=500,
+                        help="Buffered updates per bulk write (default: 500)")
+    parser.add_argument("--flush-interval", type=float, default=5.0,
+                        help="Maximum seconds an update waits in the buffer (default: 5)")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_PATH,
+                        help=f"Run journal file (default: {DEFAULT_JOURNAL_PATH})")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue after the last checkpointed track of the previous run")
+    parser.add_argument("--max-attempts", type=int, default=3,
+                        help="Skip tracks that failed this many times recently (default: 3)")
+    parser.add_argument("--retry-days", type=float, default=30,
+                        help="How long failed tracks are skipped for (default: 30 days)")
+    parser.add_argument("--infer-threshold", type=float, default=DEFAULT_INFER_THRESHOLD,
+                        help="Share of an artist's or album's genre votes needed to infer a genre "
+                             f"from the collection (default: {DEFAULT_INFER_THRESHOLD})")
+    parser.add_argument("--no-infer", action="store_true",
+                        help="Look up every track on Last.fm instead of inferring genres from the collection")
+    parser.add_argument("--no-summaries", action="store_true",
+                        help="Do not refresh the summary collections of the years that changed")
+    parser.add_argument("--stats", metavar="PATH",
+                        help="Write lookup statistics to this file at the end ('-' for stdout)")
+    parser.add_argument("--stats-format", choices=["json", "prometheus"], default="json",
+                        help="Format of the --stats output (default: json)")
+    args = parser.parse_args(argv)
+    # Fail before touching MongoDB or the journal if there is no Last.fm key
+    get_api_key()
+
+    journal = RunJournal(args.journal, max_attempts=args.max_attempts,
+                         retry_after=args.retry_days * DAY)
+    # The watermark only holds for the work set it was recorded on
+    filters = {"status": sorted(args.status), "year": args.year}
+    after_id = None
+    if args.resume:
+        try:
+            after_id = journal.resume_after(filters)
+        except ValueError as e:
+            raise SystemExit(f"ERROR: {e}")
+    if after_id is not None:
+        print(f"Resuming after track {after_id}")
+    elif not args.watch:
+        # --watch leaves the watermark alone so an interrupted backlog run can still be resumed
+        journal.reset(filters)
+
+    LASTFM_LIMITER.set_rate(args.rps)
+    # Hedged lookups keep up to two requests per worker in flight
+    configure_client(pool_size=args.workers * (2 if args.hedged else 1))
+    cache = None
+    if not args.no_cache:
+        cache = configure_cache(
+            args.cache,
+            ttl=args.cache_ttl * DAY,
+            negative_ttl=args.negative_ttl * DAY,
+            max_entries=args.cache_size,
+        )
 
-def main():
     print("Connecting to MongoDB...")
     client, collection = connect_to_mongodb()
 
-    print("Finding tracks with missing genres...")
-    tracks = find_tracks_with_missing_genres(collection)
+    queued = ensure_queue_index(collection)
+    if queued:
+        print(f"Created the genre queue index; queued {queued} tracks for enrichment")
+    elif args.rebuild_queue:
+        print(f"Queued {backfill(collection)} tracks for enrichment")
 
-    total = len(tracks)
-    print(f"Found {total} tracks with missing genres\n")
+    if args.watch:
+        # Open-ended: the total is however many tracks arrive before Ctrl-C
+        total = None
+        batches = watch_missing_genres(collection, args.batch_size, args.watch_wait,
+                                       args.poll_interval, after_id, args.status,
+                                       resume_token=journal.watch_token,
+                                       save_resume_token=journal.record_watch_token)
+    else:
+        print("Finding tracks with missing genres...")
+        if args.stream:
+            query = missing_genre_query(after_id, args.status, args.year)
+            total = collection.count_documents(query, **({"limit": args.limit} if args.limit else {}))
+            batches = iter_tracks_with_missing_genres(collection, args.batch_size, after_id,
+                                                      args.status, args.year, args.limit)
+        else:
+            tracks = find_tracks_with_missing_genres(collection, after_id, args.status, args.year, args.limit)
+            total = len(tracks)
+            # Sorted by _id, so each slice can be checkpointed for --resume
+            batches = [tracks[i:i + args.batch_size] for i in range(0, total, args.batch_size)]
+        print(f"Found {total} tracks with missing genres\n")
 
     if total == 0:
         print("No tracks need genre updates!")
         client.close()
+        if cache:
+            cache.close()
         return
 
+    index = None
+    if not args.no_infer:
+        print("Indexing genres already in the collection...")
+        index = GenreIndex.from_collection(collection, threshold=args.infer_threshold)
+        print(f"Indexed {len(index.artists)} artists and {len(index.albums)} albums\n")
+
     # Track statistics
-    updated_count = 0
     skipped_count = 0
+    deferred_count = 0
+    inferred_count = 0
+    seen_count = 0
+    touched_years = set()
+    writer = BulkWriter(collection, max_ops=args.flush_size, max_interval=args.flush_interval)
+    fatal = None
 
-    # Process each track
-    for idx, track_doc in enumerate(tracks, 1):
-        track_id = track_doc.get('_id')
-        track_name = track_doc.get('track', 'Unknown Track')
-        artist_name = track_doc.get('artist', 'Unknown Artist')
-        album = track_doc.get('album', 'Unknown Album')
-        year = track_doc.get('year', 'Unknown Year')
-
-        print(f"[{idx}/{total}] {artist_name} - {track_name}")
-        print(f"         Album: {album} ({year})")
-
-        # Get genre from Last.fm
-        genre = get_genre_for_track(artist_name, track_name)
-
-        print(f"         Genre found: {genre}")
-
-        # Update database if genre is not "Unknown"
-        if genre and genre.lower() != "unknown":
-            try:
-                result = collection.update_one(
-                    {"_id": track_id},
-                    {"$set": {"genre": genre}}
-                )
-                if result.modified_count > 0:
-                    print(f"         ✓ Updated in database")
-                    updated_count += 1
-                else:
-                    print(f"         ! No changes made")
-            except Exception as e:
-                print(f"         ✗ Error updating database: {e}", file=sys.stderr)
-        else:
-            print(f"         - Skipped (genre unknown)")
-            skipped_count += 1
-
-        print()
+    # Resolve each artist once and queue each (artist, genre) decision as one write
+    try:
+        for batch in batches:
+            seen_count += len(batch)
+            doc_of = {doc['_id']: doc for doc in batch}
+            queue_new_tracks(collection, batch)
+            todo = batch
+            if index is not None:
+                inferred, todo = infer_genres(batch, index)
+                for genre, track_ids in inferred.items():
+                    writer.add(genre, track_ids)
+                    touched_years.update(doc_of[i].get('year') for i in track_ids)
+                    journal.record(track_ids, "inferred")
+                    inferred_count += len(track_ids)
+                    LOOKUP_STATS.record_resolution("collection", 0, tracks=len(track_ids))
+                if inferred:
+                    print(f"Inferred {sum(map(len, inferred.values()))} track(s) from the collection")
+            lookups = [doc for doc in todo if not journal.should_skip(doc['_id'])]
+            skipped_count += len(todo) - len(lookups)
+            for artist, decisions in plan_updates(lookups, args.workers, hedged=args.hedged):
+                print(artist)
+                for genre, track_ids in decisions.items():
+                    if genre is None:
+                        # Leave the tracks untouched so the next run picks them up again
+                        print(f"         - Deferred {len(track_ids)} track(s) (Last.fm unavailable)")
+                        deferred_count += len(track_ids)
+                        journal.record(track_ids, "deferred")
+                    elif genre.lower() == "unknown":
+                        print(f"         - Skipped {len(track_ids)} track(s) (genre unknown)")
+                        skipped_count += len(track_ids)
+                        journal.record(track_ids, "unknown")
+                    else:
+                        print(f"         ✓ {genre}: {len(track_ids)} track(s)")
+                        writer.add(genre, track_ids)
+                        touched_years.update(doc_of[i].get('year') for i in track_ids)
+                        journal.record(track_ids, "error" if genre == "error" else "resolved")
+                        if index is not None and genre != "error":
+                            # Later batches (and a --watch worker) can infer from this run's answers
+                            for i in track_ids:
+                                index.add(doc_of[i].get('artist'), doc_of[i].get('album'), genre)
+            writer.flush()
+            if args.watch:
+                # Watched tracks arrive in no particular _id order, so they must
+                # not move the --resume watermark; only keep their outcomes
+                journal.save()
+            else:
+                # Everything in this batch is written; it is safe to resume after it
+                journal.checkpoint(max(doc['_id'] for doc in batch))
+            if args.watch and touched_years and not args.no_summaries:
+                # Don't wait for the end of an open-ended run
+                materialize(collection.database, touched_years)
+                touched_years.clear()
+    except KeyboardInterrupt:
+        print("\nInterrupted; saving progress. Re-run with --resume to continue.")
+    except LastfmFatalError as e:
+        fatal = e
+        print(f"\nERROR: {e}. Fix LASTFM_API_KEY and re-run with --resume to continue.", file=sys.stderr)
+    finally:
+        writer.close()
+        journal.save()
 
+    if touched_years and not args.no_summaries:
+        counts = materialize(collection.database, touched_years)
+        print(f"Refreshed summaries for {len(counts)} year(s)")
     client.close()
     print("=" * 60)
-    print(f"Done! Updated: {updated_count}, Skipped: {skipped_count}, Total: {total}")
+    print(f"Done! Updated: {writer.modified} ({inferred_count} inferred from the collection), "
+          f"Skipped: {skipped_count}, Deferred: {deferred_count}, "
+          f"Total: {seen_count if total is None else total}")
+    if writer.errors:
+        print(f"{writer.errors} write errors", file=sys.stderr)
+    if cache:
+        stats = cache.stats()
+        cache.evict()
+        cache.close()
+        print(f"Last.fm cache: {stats['hits']} hits ({stats['negative_hits']} negative), "
+              f"{stats['misses']} misses, {stats['hit_rate']:.0%} hit rate")
+    report_lookup_stats(args.stats, args.stats_format)
+    if fatal:
+        raise SystemExit(1)
+
+
+def report_lookup_stats(path=None, stats_format="json"):
+    """Print a per-tier summary and optionally dump LOOKUP_STATS to `path`."""
+    summary = LOOKUP_STATS.as_dict()
+    if summary["tracks"]:
+        tiers = ", ".join(f"{tier} {info['tracks']} ({info['calls_per_track']} calls/track)"
+                          if info["tracks"] else f"{tier} ({info['calls']} calls)"
+                          for tier, info in summary["tiers"].items())
+        print(f"Resolved by tier: {tiers}; {summary['requests_per_track']} requests/track overall")
+    if not path:
+        return
+    output = LOOKUP_STATS.to_prometheus() if stats_format == "prometheus" else LOOKUP_STATS.to_json() + "\n"
+    if path == "-":
+        sys.stdout.write(output)
+    else:
+        with open(path, 'w') as f:
+            f.write(output)
+        print(f"Wrote lookup statistics to {path}")
 
 
 if __name__ == "__main__":